@@ -0,0 +1,31 @@
+-- ============================================================
+-- FRIDA: Coluna content_sha256 na tabela images (dedup do pipeline)
+-- Executar no Supabase Dashboard → SQL Editor
+-- Depende de: 05_create_images.sql
+-- ============================================================
+--
+-- Guarda o SHA-256 (hex) dos bytes da imagem ORIGINAL enviada ao
+-- pipeline em todos os registros gerados por ela (original, segmented,
+-- processed). Re-uploads idênticos para o mesmo produto reutilizam o
+-- resultado anterior em vez de rodar rembg + composição de novo.
+--
+-- Ativar no backend com PIPELINE_DEDUP_ENABLED=true após executar.
+-- ============================================================
+
+ALTER TABLE public.images
+  ADD COLUMN IF NOT EXISTS content_sha256 TEXT
+  CHECK (content_sha256 IS NULL OR content_sha256 ~ '^[0-9a-f]{64}$');
+
+-- Lookup por produto + hash (query do dedup)
+CREATE INDEX IF NOT EXISTS idx_images_product_content_sha256
+  ON public.images(product_id, content_sha256)
+  WHERE content_sha256 IS NOT NULL;
+
+-- ============================================================
+-- Verificar coluna criada
+-- ============================================================
+SELECT
+  column_name,
+  data_type
+FROM information_schema.columns
+WHERE table_name = 'images' AND column_name = 'content_sha256';
@@ -0,0 +1,36 @@
+-- ============================================================
+-- FRIDA: Etapa 'downloading' no current_step dos jobs
+-- Executar no Supabase Dashboard → SQL Editor
+-- Depende de: 07_create_jobs_table.sql
+-- ============================================================
+--
+-- O worker marca o job como 'downloading' no mesmo UPDATE que o
+-- reivindica (claim_job), enquanto baixa a imagem original do
+-- bucket raw. A CHECK original não listava essa etapa.
+-- ============================================================
+
+ALTER TABLE public.jobs
+  DROP CONSTRAINT IF EXISTS jobs_current_step_check;
+
+ALTER TABLE public.jobs
+  ADD CONSTRAINT jobs_current_step_check CHECK (
+    current_step IN (
+      'uploading',      -- Fazendo upload da imagem original
+      'classifying',    -- Classificando com Gemini
+      'downloading',    -- Baixando imagem original (worker)
+      'segmenting',     -- Removendo fundo (rembg/remove.bg)
+      'composing',      -- Compondo fundo branco (ImageComposer)
+      'validating',     -- Validando qualidade (HuskLayer)
+      'saving',         -- Salvando no storage
+      'done'            -- Concluído
+    )
+  );
+
+-- ============================================================
+-- Verificar constraint
+-- ============================================================
+SELECT
+  conname,
+  pg_get_constraintdef(oid)
+FROM pg_constraint
+WHERE conname = 'jobs_current_step_check';
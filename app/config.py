@@ -104,15 +104,31 @@ class Settings:
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
     DEBUG: bool = os.getenv("DEBUG", "true").lower() == "true"
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
     
     # Image Processing
     OUTPUT_SIZE: tuple[int, int] = (1080, 1080)
     BACKGROUND_COLOR: str = "#FFFFFF"
 
+    # Segmentação fallback (remove.bg) - habilitado só com API key
+    REMOVEBG_API_KEY: str = os.getenv("REMOVEBG_API_KEY", "")
+
+    # Segmentação (rembg) - sessão ONNX reutilizada entre requests
+    REMBG_MODEL: str = os.getenv("REMBG_MODEL", "u2net")  # ex: isnet-general-use
+    REMBG_PROVIDERS: list[str] = ["CUDAExecutionProvider", "CPUExecutionProvider"]  # GPU se disponível
+
     # DoS Protection - Limites de arquivo
     MAX_FILE_SIZE_MB: int = 10  # Tamanho máximo do arquivo em MB
     MAX_FILE_SIZE_BYTES: int = MAX_FILE_SIZE_MB * 1024 * 1024  # 10MB em bytes
     MAX_IMAGE_DIMENSION: int = 8000  # Dimensão máxima (largura ou altura) em pixels
+    MAX_IMAGE_PIXELS: int = MAX_IMAGE_DIMENSION * MAX_IMAGE_DIMENSION  # Guard de decompression bomb do Pillow
+    MAX_MULTIPART_OVERHEAD_BYTES: int = 64 * 1024  # Margem para boundary/campos do multipart no Content-Length
+
+    # Dedup do pipeline por SHA-256 do conteúdo (requer 09_add_images_content_sha256.sql)
+    PIPELINE_DEDUP_ENABLED: bool = os.getenv("PIPELINE_DEDUP_ENABLED", "false").lower() == "true"
+
+    # Threads do JobWorkerDaemon (jobs reivindicados atomicamente via claim_job)
+    JOB_WORKER_THREADS: int = int(os.getenv("JOB_WORKER_THREADS", "1"))
     
     @classmethod
     def validate(cls) -> list[str]:
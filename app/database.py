@@ -234,7 +234,10 @@ def create_image(
     type: str, 
     bucket: str, 
     path: str, 
-    user_id: str
+    user_id: str,
+    quality_score: Optional[int] = None,
+    client: Optional[Client] = None,
+    content_sha256: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Registra uma imagem processada no banco.
@@ -245,6 +248,9 @@ def create_image(
         bucket: Nome do bucket no Supabase Storage
         path: Caminho do arquivo no storage
         user_id: UUID do usuário criador
+        quality_score: Score de qualidade 0-100 (opcional, gravado no mesmo INSERT)
+        client: Client já aberto para reutilizar a conexão (opcional)
+        content_sha256: SHA-256 hex da imagem original (dedup, opcional)
         
     Returns:
         Dict com dados completos da imagem registrada
@@ -253,21 +259,16 @@ def create_image(
         ValueError: Se type não for válido
         Exception: Se falha ao inserir no banco
     """
-    # Validar type
-    valid_types = ['original', 'segmented', 'processed']
-    if type not in valid_types:
-        raise ValueError(f"Tipo inválido: {type}. Use: {', '.join(valid_types)}")
-    
-    client = get_supabase_client()
+    # Validar type e montar payload
+    record = _build_image_record(
+        product_id, type, bucket, path, user_id, quality_score, content_sha256
+    )
     
+    # Reusar client do chamador evita novo handshake TLS por insert
+    client = client or get_supabase_client()
+
     try:
-        result = client.table('images').insert({
-            'product_id': product_id,
-            'type': type,
-            'storage_bucket': bucket,
-            'storage_path': path,
-            'created_by': user_id
-        }).execute()
+        result = client.table('images').insert(record).execute()
         
         if not result.data:
             raise Exception("Falha ao registrar imagem: resposta vazia")
@@ -279,6 +280,132 @@ def create_image(
         raise
 
 
+def create_images(
+    images: list,
+    client: Optional[Client] = None
+) -> list:
+    """
+    Registra várias imagens em um único INSERT (bulk).
+    
+    Args:
+        images: Lista de dicts com as chaves de create_image
+            (product_id, type, bucket, path, user_id,
+            quality_score opcional, content_sha256 opcional)
+        client: Client já aberto para reutilizar a conexão (opcional)
+        
+    Returns:
+        Lista de registros criados, na mesma ordem de images
+        
+    Raises:
+        ValueError: Se algum type não for válido
+        Exception: Se falha ao inserir no banco
+    """
+    records = [
+        _build_image_record(
+            image['product_id'],
+            image['type'],
+            image['bucket'],
+            image['path'],
+            image['user_id'],
+            image.get('quality_score'),
+            image.get('content_sha256')
+        )
+        for image in images
+    ]
+    
+    if not records:
+        return []
+    
+    # Bulk insert do PostgREST exige as mesmas chaves em todos os objetos
+    columns = set().union(*records)
+    records = [{column: record.get(column) for column in columns} for record in records]
+    
+    client = client or get_supabase_client()
+    
+    try:
+        result = client.table('images').insert(records).execute()
+        
+        if not result.data or len(result.data) != len(records):
+            raise Exception("Falha ao registrar imagens: resposta incompleta")
+        
+        return result.data
+        
+    except Exception as e:
+        print(f"[DATABASE] ❌ Erro ao registrar imagens em lote: {str(e)}")
+        raise
+
+
+def _build_image_record(
+    product_id: str,
+    type: str,
+    bucket: str,
+    path: str,
+    user_id: str,
+    quality_score: Optional[int] = None,
+    content_sha256: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Valida type e monta o payload de INSERT da tabela images.
+    
+    Raises:
+        ValueError: Se type não for válido
+    """
+    valid_types = ['original', 'segmented', 'processed']
+    if type not in valid_types:
+        raise ValueError(f"Tipo inválido: {type}. Use: {', '.join(valid_types)}")
+    
+    record = {
+        'product_id': product_id,
+        'type': type,
+        'storage_bucket': bucket,
+        'storage_path': path,
+        'created_by': user_id
+    }
+    if quality_score is not None:
+        record['quality_score'] = quality_score
+    if content_sha256 is not None:
+        record['content_sha256'] = content_sha256
+    
+    return record
+
+
+def get_images_by_content_hash(
+    content_sha256: str,
+    product_id: str,
+    user_id: str,
+    client: Optional[Client] = None
+) -> list:
+    """
+    Busca imagens do produto geradas a partir de um upload com o mesmo conteúdo.
+    
+    Args:
+        content_sha256: SHA-256 hex da imagem original
+        product_id: UUID do produto (dedup é por produto)
+        user_id: UUID do usuário dono das imagens
+        client: Client já aberto para reutilizar a conexão (opcional)
+        
+    Returns:
+        Lista de registros (mais recentes primeiro) ou lista vazia
+    """
+    client = client or get_supabase_client()
+    
+    try:
+        result = client.table('images')\
+            .select('*')\
+            .eq('product_id', product_id)\
+            .eq('created_by', user_id)\
+            .eq('content_sha256', content_sha256)\
+            .order('created_at', desc=True)\
+            .limit(9)\
+            .execute()
+        
+        return result.data if result.data else []
+        
+    except Exception as e:
+        print(f"[DATABASE] ❌ Erro ao buscar imagens por hash: {str(e)}")
+        return []
+
+
 # =============================================================================
 # JOBS CRUD (PRD-04)
 # =============================================================================
@@ -394,7 +521,7 @@ def update_job_progress(
     progress: Optional[int] = None,
     provider: Optional[str] = None,
     last_error: Optional[str] = None
-) -> bool:
+) -> Optional[Dict[str, Any]]:
     """
     Atualiza progresso do job.
     Apenas campos não-None são atualizados.
@@ -408,7 +535,7 @@ def update_job_progress(
         last_error: Mensagem de erro (se houver)
     
     Returns:
-        True se atualizou, False se falhou
+        Job atualizado (linha devolvida pelo próprio UPDATE) ou None se falhou
     """
     try:
         client = get_supabase_client()
@@ -428,20 +555,55 @@ def update_job_progress(
         
         if not update_data:
             print("[DATABASE] ✗ Nenhum campo para atualizar")
-            return False
+            return None
         
         response = client.table("jobs").update(update_data).eq("id", job_id).execute()
         
         if response.data and len(response.data) > 0:
             print(f"[DATABASE] ✓ Job {job_id} atualizado: {list(update_data.keys())}")
-            return True
+            return response.data[0]
         else:
             print(f"[DATABASE] ✗ Job {job_id} não encontrado para update")
-            return False
+            return None
             
     except Exception as e:
         print(f"[DATABASE] ✗ Erro ao atualizar job {job_id}: {str(e)}")
-        return False
+        return None
+
+
+def claim_job(job_id: str, progress: int = 0) -> Optional[Dict[str, Any]]:
+    """
+    Reivindica job para processamento (queued/failed → processing/downloading).
+    
+    UPDATE condicional em uma única chamada: só uma das threads/processos
+    que disputam o mesmo job recebe a linha de volta; as demais recebem
+    None e seguem para o próximo.
+    
+    Args:
+        job_id: UUID do job
+        progress: Progresso inicial (0-100)
+    
+    Returns:
+        Job atualizado ou None se não existe / já foi reivindicado
+    """
+    try:
+        client = get_supabase_client()
+        
+        response = client.table("jobs")\
+            .update({"status": "processing", "current_step": "downloading", "progress": progress})\
+            .eq("id", job_id)\
+            .in_("status", ["queued", "failed"])\
+            .execute()
+        
+        if response.data and len(response.data) > 0:
+            print(f"[DATABASE] ✓ Job {job_id} reivindicado")
+            return response.data[0]
+        
+        return None
+        
+    except Exception as e:
+        print(f"[DATABASE] ✗ Erro ao reivindicar job {job_id}: {str(e)}")
+        return None
 
 
 def increment_job_attempt(
@@ -505,7 +667,11 @@ def increment_job_attempt(
         return {"attempts": 0, "max_attempts": 3, "should_retry": False}
 
 
-def complete_job(job_id: str, output_data: Dict[str, Any]) -> bool:
+def complete_job(
+    job_id: str,
+    output_data: Dict[str, Any],
+    provider: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
     """
     Marca job como completed e salva output.
     
@@ -521,9 +687,10 @@ def complete_job(job_id: str, output_data: Dict[str, Any]) -> bool:
                 "quality_score": 95,
                 "quality_passed": True
             }
+        provider: 'remove.bg' ou 'rembg' (gravado no mesmo UPDATE)
     
     Returns:
-        True se completou, False se falhou
+        Job completado (linha devolvida pelo próprio UPDATE) ou None se falhou
     """
     try:
         client = get_supabase_client()
@@ -534,22 +701,24 @@ def complete_job(job_id: str, output_data: Dict[str, Any]) -> bool:
             "progress": 100,
             "output_data": output_data
         }
+        if provider is not None:
+            update_data["provider"] = provider
         
         response = client.table("jobs").update(update_data).eq("id", job_id).execute()
         
         if response.data and len(response.data) > 0:
             print(f"[DATABASE] ✓ Job {job_id} completado com sucesso")
-            return True
+            return response.data[0]
         else:
             print(f"[DATABASE] ✗ Job {job_id} não encontrado para completar")
-            return False
+            return None
             
     except Exception as e:
         print(f"[DATABASE] ✗ Erro ao completar job {job_id}: {str(e)}")
-        return False
+        return None
 
 
-def fail_job(job_id: str, error: str) -> bool:
+def fail_job(job_id: str, error: str) -> Optional[Dict[str, Any]]:
     """
     Marca job como failed definitivamente (sem mais retries).
     
@@ -558,7 +727,7 @@ def fail_job(job_id: str, error: str) -> bool:
         error: Mensagem de erro final
     
     Returns:
-        True se atualizou, False se falhou
+        Job atualizado (linha devolvida pelo próprio UPDATE) ou None se falhou
     """
     try:
         client = get_supabase_client()
@@ -577,14 +746,14 @@ def fail_job(job_id: str, error: str) -> bool:
         
         if response.data and len(response.data) > 0:
             print(f"[DATABASE] ✓ Job {job_id} marcado como failed (definitivo)")
-            return True
+            return response.data[0]
         else:
             print(f"[DATABASE] ✗ Job {job_id} não encontrado para fail")
-            return False
+            return None
             
     except Exception as e:
         print(f"[DATABASE] ✗ Erro ao marcar job {job_id} como failed: {str(e)}")
-        return False
+        return None
 
 
 def get_next_queued_job() -> Optional[Dict[str, Any]]:
@@ -798,7 +967,7 @@ def update_technical_sheet(
     data: dict,
     user_id: str,
     change_summary: Optional[str] = None
-) -> bool:
+) -> Optional[dict]:
     """
     Atualiza dados da ficha técnica.
     O trigger de versionamento cuida de incrementar versão e arquivar.
@@ -810,7 +979,8 @@ def update_technical_sheet(
         change_summary: Descrição opcional da mudança
     
     Returns:
-        True se sucesso, False se falha
+        Ficha atualizada (linha devolvida pelo próprio UPDATE, já com a
+        versão incrementada pelo trigger BEFORE UPDATE) ou None se falha
     """
     try:
         client = get_supabase_client()
@@ -819,7 +989,7 @@ def update_technical_sheet(
         current = get_technical_sheet(sheet_id)
         if not current:
             print(f"[DATABASE] ✗ Sheet não encontrada: {sheet_id}")
-            return False
+            return None
         
         # Mesclar dados preservando _version e _schema se não fornecidos
         current_data = current.get("data", {})
@@ -842,13 +1012,13 @@ def update_technical_sheet(
         if response.data:
             new_version = response.data[0].get("version", "?")
             print(f"[DATABASE] ✓ Sheet atualizada: {sheet_id} (v{new_version})")
-            return True
+            return response.data[0]
         
-        return False
+        return None
         
     except Exception as e:
         print(f"[DATABASE] ✗ Erro ao atualizar sheet: {str(e)}")
-        return False
+        return None
 
 
 def update_sheet_status(
@@ -0,0 +1,73 @@
+"""
+Frida Orchestrator - Logging
+Logger da aplicação com escrita em stdout fora das threads de trabalho.
+
+Os registros são enfileirados (QueueHandler) e escritos por uma thread
+dedicada (QueueListener): worker e requests não bloqueiam em I/O de
+stdout/pipe, e mensagens abaixo do LOG_LEVEL custam só um isEnabledFor.
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+
+from app.config import settings
+
+
+# Logger raiz do pacote: módulos usam get_logger(__name__) → "app.*"
+ROOT_LOGGER_NAME = "app"
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging() -> logging.Logger:
+    """
+    Configura (uma única vez) o logger raiz da aplicação.
+
+    Mensagens já carregam a tag do módulo (ex: "[WORKER] ..."), então o
+    formato é só a mensagem, igual à saída anterior via print().
+
+    Returns:
+        Logger raiz da aplicação
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    if _listener is not None:
+        return root
+
+    with _setup_lock:
+        if _listener is None:
+            log_queue = queue.SimpleQueue()
+
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+            _listener = logging.handlers.QueueListener(
+                log_queue, stream_handler, respect_handler_level=True
+            )
+            _listener.start()
+            atexit.register(_listener.stop)
+
+            root.addHandler(logging.handlers.QueueHandler(log_queue))
+            root.setLevel(settings.LOG_LEVEL)
+            root.propagate = False  # Evita duplicar no handler do uvicorn
+
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Retorna logger do módulo, garantindo o setup da aplicação.
+
+    Args:
+        name: Nome do módulo (use __name__)
+
+    Returns:
+        Logger filho de "app"
+    """
+    setup_logging()
+    return logging.getLogger(name)
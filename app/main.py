@@ -7,7 +7,7 @@ import io
 import base64
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, HTMLResponse, StreamingResponse
+from fastapi.responses import JSONResponse, HTMLResponse, Response
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 from datetime import datetime
@@ -58,6 +58,50 @@ limiter = Limiter(key_func=get_remote_address)
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+# =============================================================================
+# Upload Size Limit (DoS Protection)
+# =============================================================================
+
+class UploadSizeLimitMiddleware:
+    """
+    Rejeita uploads grandes pelo header Content-Length, antes do form parsing.
+
+    Middleware ASGI puro: roda antes de o FastAPI fazer spool do multipart
+    para o UploadFile, então um 413 aqui não lê o corpo. Uploads sem
+    Content-Length (chunked) seguem para a checagem de tamanho da rota.
+    O Content-Length do multipart inclui boundary e campos extras, por isso
+    aplica uma margem (MAX_MULTIPART_OVERHEAD_BYTES) sobre o limite do arquivo.
+    """
+
+    def __init__(self, app, paths: tuple[str, ...]):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.limit = settings.MAX_FILE_SIZE_BYTES + settings.MAX_MULTIPART_OVERHEAD_BYTES
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "POST"
+            and scope["path"] in self.paths
+        ):
+            content_length = dict(scope["headers"]).get(b"content-length", b"")
+            if content_length.isdigit() and int(content_length) > self.limit:
+                size_mb = int(content_length) / (1024 * 1024)
+                response = JSONResponse(
+                    status_code=413,
+                    content={
+                        "detail": f"Arquivo muito grande: {size_mb:.1f}MB. Limite: {settings.MAX_FILE_SIZE_MB}MB"
+                    }
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+
+# Adicionado antes do CORS para ficar dentro dele (o 413 leva os headers CORS)
+app.add_middleware(UploadSizeLimitMiddleware, paths=("/process", "/process-async"))
+
 # CORS para permitir requests do frontend Next.js
 app.add_middleware(
     CORSMiddleware,
@@ -272,6 +316,9 @@ async def lifespan(app: FastAPI):
     # 4. Iniciar Job Worker Daemon (PRD-04)
     # -------------------------------------------------------------------------
     if settings.SUPABASE_URL and settings.SUPABASE_KEY:
+        # Pré-aquecer conexões keep-alive do pipeline síncrono
+        image_pipeline_sync.warmup()
+
         try:
             job_daemon.start()
             print("[STARTUP] ✓ JobWorkerDaemon iniciado (processamento async)")
@@ -452,12 +499,13 @@ def processar_produto(
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Erro ao verificar tamanho do arquivo: {str(e)}")
 
+    ficha_future = None
     try:
         # 1. Lê o conteúdo do arquivo (síncrono via SpooledTemporaryFile)
         content = file.file.read()
 
         # 2. Validação PROFUNDA: magic numbers + integridade Pillow
-        is_valid, validation_msg = validate_image_deep(content, file.content_type)
+        is_valid, validation_msg = validate_image_deep(content, file.content_type, quick=False)
         if not is_valid:
             raise HTTPException(
                 status_code=400,
@@ -486,6 +534,18 @@ def processar_produto(
         else:
             print("[PROCESS] Serviço de classificação não disponível (GEMINI_API_KEY não configurada)")
         
+        # Ficha técnica (opcional): a chamada ao Gemini é o passo mais longo
+        # e só depende da imagem original, então roda em paralelo ao
+        # cadastro do produto e ao pipeline
+        if gerar_ficha and tech_sheet_service:
+            print("[PROCESS] Gerando ficha técnica (em paralelo ao pipeline)...")
+            ficha_future = tech_sheet_service.iniciar_ficha_upload(
+                content,
+                file.content_type,
+                classificacao["item"],
+                estilo=classificacao.get("estilo")
+            )
+        
         # ============================================================
         # NOVO: Salvar produto no banco após classificação
         # ============================================================
@@ -546,25 +606,10 @@ def processar_produto(
             # Usar URL da imagem processada do pipeline
             imagem_bytes = None  # Imagem já está no storage
         
-        # 6. Gera ficha técnica (opcional)
+        # 6. Aguarda a ficha técnica (disparada após a classificação)
         ficha = None
-        if gerar_ficha and tech_sheet_service:
-            print("[PROCESS] Gerando ficha técnica...")
-            # Se tiver imagem do fallback, usar ela
-            if imagem_bytes:
-                from PIL import Image
-                from io import BytesIO
-                imagem_final = Image.open(BytesIO(imagem_bytes))
-            else:
-                # Carregar imagem original para ficha técnica
-                from PIL import Image
-                from io import BytesIO
-                imagem_final = Image.open(BytesIO(content))
-            
-            ficha = tech_sheet_service.gerar_ficha_completa(
-                imagem_final, 
-                classificacao["item"]
-            )
+        if ficha_future is not None:
+            ficha = ficha_future.result()
             print("[PROCESS] ✓ Ficha técnica gerada")
         
         # 7. Preparar resposta de imagem (separando base64 de URL)
@@ -611,6 +656,11 @@ def processar_produto(
             status_code=500,
             detail=f"Erro ao processar imagem: {str(e)}"
         )
+    finally:
+        # Requisição abortada antes de ler a ficha: descarta o Gemini ainda
+        # na fila do pool (sem efeito se já terminou ou está rodando)
+        if ficha_future is not None:
+            ficha_future.cancel()
 
 
 # =============================================================================
@@ -671,7 +721,7 @@ def processar_produto_async(
         content = file.file.read()
 
         # Validação profunda: magic numbers + Pillow integrity
-        is_valid, validation_msg = validate_image_deep(content, file.content_type)
+        is_valid, validation_msg = validate_image_deep(content, file.content_type, quick=False)
         if not is_valid:
             raise HTTPException(
                 status_code=400,
@@ -825,6 +875,9 @@ def processar_produto_async(
     print(f"[ASYNC] ✓ Job criado: {job_id}")
     print(f"[ASYNC] ✓ Processamento enfileirado para user {user_id}")
     
+    # Acorda o daemon (pode estar em backoff de fila vazia)
+    job_daemon.notify()
+    
     # ============================================================
     # RESPOSTA IMEDIATA
     # ============================================================
@@ -983,7 +1036,7 @@ def classificar_apenas(
     content = file.file.read()
     
     # Validação profunda
-    is_valid, validation_msg = validate_image_deep(content, file.content_type)
+    is_valid, validation_msg = validate_image_deep(content, file.content_type, quick=False)
     if not is_valid:
         raise HTTPException(
             status_code=400,
@@ -1146,7 +1199,7 @@ def remover_fundo_apenas(
     content = file.file.read()
     
     # Validação profunda
-    is_valid, validation_msg = validate_image_deep(content, file.content_type)
+    is_valid, validation_msg = validate_image_deep(content, file.content_type, quick=False)
     if not is_valid:
         raise HTTPException(
             status_code=400,
@@ -1378,21 +1431,16 @@ def update_product_sheet(
     # Preparar dados para atualização
     new_data = request.data.dict(exclude_none=True)
     
-    # Atualizar
-    success = update_technical_sheet(
+    # Atualizar (o UPDATE já devolve a linha com a nova versão)
+    updated = update_technical_sheet(
         sheet["id"],
         new_data,
         user.user_id,
         request.change_summary
     )
     
-    if not success:
-        raise HTTPException(status_code=500, detail="Falha ao atualizar ficha")
-    
-    # Buscar atualizada
-    updated = get_technical_sheet(sheet["id"])
     if not updated:
-        raise HTTPException(status_code=500, detail="Ficha atualizada mas não encontrada")
+        raise HTTPException(status_code=500, detail="Falha ao atualizar ficha")
     
     return SheetResponse(
         sheet_id=updated["id"],
@@ -1597,7 +1645,7 @@ def export_sheet_pdf(
     
     # Gerar PDF
     try:
-        pdf_buffer = pdf_generator.generate(
+        pdf_bytes = pdf_generator.generate_bytes(
             sheet_data=sheet_data,
             product_data=product,
             processed_image_url=processed_url
@@ -1610,8 +1658,10 @@ def export_sheet_pdf(
     version = sheet.get("version", 1)
     filename = f"ficha_tecnica_{category}_v{version}.pdf"
     
-    return StreamingResponse(
-        pdf_buffer,
+    # PDF já está inteiro em memória: Response envia de uma vez (com
+    # Content-Length), sem iterar o buffer linha a linha
+    return Response(
+        content=pdf_bytes,
         media_type="application/pdf",
         headers={
             "Content-Disposition": f"attachment; filename={filename}"
@@ -1,24 +1,36 @@
 """
 Frida Orchestrator - Services Package
+
+Os exports são resolvidos sob demanda (PEP 562): importar um serviço leve
+(ex: app.services.image_composer) não carrega rembg/onnxruntime nem o SDK
+do Gemini junto.
 """
 
-from .classifier import ClassifierService
-from .background_remover import BackgroundRemoverService
-from .tech_sheet import TechSheetService
-from .image_composer import ImageComposer, image_composer
-from .husk_layer import HuskLayer, husk_layer, QualityReport
-from .image_pipeline import ImagePipelineSync, image_pipeline_sync, PipelineResult
+import importlib
+
+# Nome exportado → submódulo que o define
+_EXPORTS = {
+    "ClassifierService": ".classifier",
+    "BackgroundRemoverService": ".background_remover",
+    "TechSheetService": ".tech_sheet",
+    "ImageComposer": ".image_composer",
+    "image_composer": ".image_composer",
+    "HuskLayer": ".husk_layer",
+    "husk_layer": ".husk_layer",
+    "QualityReport": ".husk_layer",
+    "ImagePipelineSync": ".image_pipeline",
+    "image_pipeline_sync": ".image_pipeline",
+    "PipelineResult": ".image_pipeline",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-__all__ = [
-    "ClassifierService",
-    "BackgroundRemoverService",
-    "TechSheetService",
-    "ImageComposer",
-    "image_composer",
-    "HuskLayer",
-    "husk_layer",
-    "QualityReport",
-    "ImagePipelineSync",
-    "image_pipeline_sync",
-    "PipelineResult"
-]
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value  # Próximos acessos não passam por aqui
+    return value
@@ -5,9 +5,9 @@ Remoção de fundo e aplicação de fundo branco puro (#FFFFFF).
 
 import io
 from PIL import Image
-from rembg import remove
 
 from app.config import settings
+from app.services.image_pipeline import remove_background
 from app.utils import image_to_bytes, resize_image
 
 
@@ -34,8 +34,8 @@ class BackgroundRemoverService:
         Returns:
             Imagem PIL com fundo transparente
         """
-        # Remove o fundo usando rembg
-        output_bytes = remove(image_bytes)
+        # Remove o fundo usando rembg (sessão ONNX compartilhada)
+        output_bytes = remove_background(image_bytes)
         
         # Converte para PIL Image
         image = Image.open(io.BytesIO(output_bytes))
@@ -12,9 +12,10 @@ Sistema de Pontuação:
 Threshold: score ≥ 80 = APROVADO
 """
 
+import numpy as np
 from PIL import Image
 from io import BytesIO
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
 from dataclasses import dataclass, field
 
 
@@ -80,24 +81,25 @@ class HuskLayer:
     # Métodos Públicos
     # ==========================================================================
     
-    def calculate_quality_score(self, image: Image.Image) -> QualityReport:
+    def calculate_quality_score(self, image: Union[Image.Image, np.ndarray]) -> QualityReport:
         """
         Calcula score de qualidade da imagem.
         
+        Os pixels são lidos uma única vez como array (HxWx3) e reutilizados
+        por todos os checks.
+        
         Args:
-            image: Imagem PIL (RGB ou RGBA)
+            image: Imagem PIL (qualquer modo) ou ndarray uint8 (HxWx3/HxWx4)
             
         Returns:
             QualityReport com score, passed e detalhes
         """
-        # Converter para RGB se necessário
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        pixels = self._as_rgb_array(image)
         
         # Executar checks
-        resolution_result = self._check_resolution(image)
-        centering_result = self._check_centering(image)
-        background_result = self._check_background_purity(image)
+        resolution_result = self._check_resolution(pixels)
+        centering_result = self._check_centering(pixels)
+        background_result = self._check_background_purity(pixels)
         
         # Calcular score total
         total_score = (
@@ -122,6 +124,20 @@ class HuskLayer:
         
         return report
     
+    def validate_image(self, image: Union[Image.Image, np.ndarray]) -> QualityReport:
+        """
+        Valida imagem já decodificada (PIL.Image ou array numpy).
+        
+        Evita decodificar de novo o PNG recém-composto.
+        
+        Args:
+            image: Imagem PIL ou array numpy (RGB/RGBA)
+            
+        Returns:
+            QualityReport com resultado da validação
+        """
+        return self.calculate_quality_score(image)
+    
     def validate_from_bytes(self, image_bytes: bytes) -> QualityReport:
         """
         Versão para API: valida imagem a partir de bytes.
@@ -143,14 +159,14 @@ class HuskLayer:
     # Métodos Privados - Checks
     # ==========================================================================
     
-    def _check_resolution(self, image: Image.Image) -> Dict:
+    def _check_resolution(self, pixels: np.ndarray) -> Dict:
         """
         Verifica se resolução atende ao mínimo.
         
         30 pontos se min(width, height) >= 1200px
         Escala linear para resoluções menores
         """
-        width, height = image.size
+        height, width = pixels.shape[:2]
         min_dim = min(width, height)
         
         if min_dim >= self.MIN_RESOLUTION:
@@ -172,7 +188,7 @@ class HuskLayer:
             'required': self.MIN_RESOLUTION
         }
     
-    def _check_centering(self, image: Image.Image) -> Dict:
+    def _check_centering(self, pixels: np.ndarray) -> Dict:
         """
         Verifica centralização e cobertura do produto.
         
@@ -180,10 +196,10 @@ class HuskLayer:
         - Produto centralizado (±15% tolerância)
         - Cobertura entre 75-95% do frame
         """
-        width, height = image.size
+        height, width = pixels.shape[:2]
         
         # Encontrar bounding box do conteúdo
-        bbox = self._find_content_bbox(image)
+        bbox = self._find_content_bbox(pixels)
         
         if bbox is None:
             # Imagem toda branca
@@ -255,13 +271,13 @@ class HuskLayer:
             'bbox': bbox
         }
     
-    def _check_background_purity(self, image: Image.Image) -> Dict:
+    def _check_background_purity(self, pixels: np.ndarray) -> Dict:
         """
         Verifica pureza do fundo branco nos cantos.
         
         30 pontos se RGB delta <5 do branco puro (255,255,255)
         """
-        width, height = image.size
+        height, width = pixels.shape[:2]
         
         # Definir áreas de amostragem (cantos, 5% do tamanho)
         sample_size = max(10, min(width, height) // 20)
@@ -281,8 +297,7 @@ class HuskLayer:
         corner_deltas = []
         
         for corner_bbox in corners:
-            corner_region = image.crop(corner_bbox)
-            delta = self._calculate_rgb_delta(corner_region)
+            delta = self._calculate_rgb_delta(pixels, corner_bbox)
             corner_deltas.append(delta)
             total_delta += delta
         
@@ -311,41 +326,50 @@ class HuskLayer:
     # Métodos Privados - Helpers
     # ==========================================================================
     
-    def _find_content_bbox(self, image: Image.Image) -> Optional[Tuple[int, int, int, int]]:
+    def _as_rgb_array(self, image: Union[Image.Image, np.ndarray]) -> np.ndarray:
+        """
+        Converte a entrada em array uint8 HxWx3 (view sem cópia quando possível).
+        
+        RGBA perde o alpha sem compor, como no convert('RGB') do Pillow;
+        demais formatos passam pelo convert('RGB').
+        """
+        if isinstance(image, np.ndarray):
+            if image.dtype == np.uint8 and image.ndim == 3 and image.shape[2] in (3, 4):
+                return image[..., :3]
+            image = Image.fromarray(image)
+        
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return np.asarray(image)
+    
+    def _find_content_bbox(self, pixels: np.ndarray) -> Optional[Tuple[int, int, int, int]]:
         """
         Encontra bounding box da área não-branca.
         
+        Amostra a cada 2 pixels (linhas e colunas), como o scan original,
+        mas com uma máscara vetorizada em vez de loop por pixel.
+        
         Args:
-            image: Imagem RGB
+            pixels: Array RGB (HxWx3)
             
         Returns:
             Tuple (left, top, right, bottom) ou None se toda branca
         """
-        width, height = image.size
-        pixels = image.load()
+        height, width = pixels.shape[:2]
         
         # Threshold para considerar "branco"
         white_threshold = 250
         
-        min_x, min_y = width, height
-        max_x, max_y = 0, 0
-        found_content = False
-        
-        # Scan mais eficiente: amostragem a cada 2 pixels
-        for y in range(0, height, 2):
-            for x in range(0, width, 2):
-                r, g, b = pixels[x, y][:3] if isinstance(pixels[x, y], tuple) else (pixels[x, y],) * 3
-                
-                # Pixel não-branco
-                if r < white_threshold or g < white_threshold or b < white_threshold:
-                    found_content = True
-                    min_x = min(min_x, x)
-                    min_y = min(min_y, y)
-                    max_x = max(max_x, x)
-                    max_y = max(max_y, y)
-        
-        if not found_content:
+        # Pixel não-branco: qualquer canal abaixo do threshold
+        content = (pixels[::2, ::2] < white_threshold).any(axis=2)
+        rows = np.flatnonzero(content.any(axis=1))
+        if rows.size == 0:
             return None
+        cols = np.flatnonzero(content.any(axis=0))
+        
+        # Índices da amostra → coordenadas da imagem
+        min_x, max_x = int(cols[0]) * 2, int(cols[-1]) * 2
+        min_y, max_y = int(rows[0]) * 2, int(rows[-1]) * 2
         
         # Adicionar margem de segurança pelo step de 2
         return (
@@ -355,30 +379,39 @@ class HuskLayer:
             min(height, max_y + 2)
         )
     
-    def _calculate_rgb_delta(self, region: Image.Image) -> float:
+    def _calculate_rgb_delta(
+        self,
+        pixels: np.ndarray,
+        bbox: Tuple[int, int, int, int]
+    ) -> float:
         """
         Calcula delta médio do branco puro na região.
         
+        Mesma semântica do crop do Pillow: a parte da caixa fora da imagem
+        conta como pixels pretos (delta 255).
+        
         Args:
-            region: Região de imagem RGB
+            pixels: Array RGB (HxWx3)
+            bbox: Região (left, top, right, bottom), pode exceder a imagem
             
         Returns:
             Delta médio (0 = branco puro)
         """
-        # Converter para array de pixels
-        pixels = list(region.getdata())
-        
-        if not pixels:
+        left, top, right, bottom = bbox
+        box_pixels = max(0, right - left) * max(0, bottom - top)
+        if not box_pixels:
             return 0
         
-        total_delta = 0
-        for pixel in pixels:
-            r, g, b = pixel[:3]
-            # Delta = distância média do branco puro
-            delta = (abs(255 - r) + abs(255 - g) + abs(255 - b)) / 3
-            total_delta += delta
+        height, width = pixels.shape[:2]
+        region = pixels[max(0, top):min(height, bottom), max(0, left):min(width, right)]
+        
+        # Soma inteira de (255 - canal); pixels fora da imagem somam 3 * 255
+        inside_pixels = region.shape[0] * region.shape[1]
+        total_delta = 255 * region.size - int(region.sum(dtype=np.int64))
+        total_delta += (box_pixels - inside_pixels) * 3 * 255
         
-        return total_delta / len(pixels)
+        # Delta do pixel = média dos 3 canais
+        return total_delta / 3 / box_pixels
 
 
 # =============================================================================
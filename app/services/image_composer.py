@@ -11,9 +11,20 @@ Features:
 - Output mínimo 1200x1200px
 """
 
-from PIL import Image, ImageFilter, ImageDraw
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageFilter
 from io import BytesIO
-from typing import Tuple, Optional
+from typing import Tuple, Optional, Union
+
+from app.utils import encode_image, image_to_raw_bytes
+
+
+@lru_cache(maxsize=8)
+def _opacity_lut(opacity: int) -> list:
+    """Tabela alpha → opacidade da sombra (alpha * opacity / 255), cacheada por opacidade."""
+    return [round(value * opacity / 255) for value in range(256)]
 
 
 class ImageComposer:
@@ -31,9 +42,11 @@ class ImageComposer:
     TARGET_SIZE: int = 1200  # Tamanho mínimo do output (px)
     PRODUCT_COVERAGE: float = 0.85  # Produto ocupa 85% do frame
     BACKGROUND_COLOR: Tuple[int, int, int] = (255, 255, 255)  # Branco puro
+    SHADOW_COLOR: Tuple[int, int, int] = (0, 0, 0)  # Cor da sombra
     SHADOW_OPACITY: int = 40  # Opacidade da sombra (0-255)
     SHADOW_BLUR: int = 15  # Blur gaussiano da sombra
     SHADOW_OFFSET: Tuple[int, int] = (0, 10)  # Offset X, Y da sombra
+    RESIZE_REDUCING_GAP: float = 2.0  # Pré-redução inteira (box) antes do LANCZOS final
     
     # ==========================================================================
     # Métodos Públicos
@@ -90,10 +103,7 @@ class ImageComposer:
         print(f"[COMPOSER] Redimensionando: {new_w}x{new_h}px (scale={scale:.2f})")
         
         # 4. Redimensionar produto com alta qualidade
-        product_resized = product.resize(
-            (new_w, new_h), 
-            Image.Resampling.LANCZOS
-        )
+        product_resized = self._resize_product(product, (new_w, new_h))
         
         # 5. Criar canvas branco
         canvas = Image.new('RGB', (target, target), self.BACKGROUND_COLOR)
@@ -103,12 +113,12 @@ class ImageComposer:
         paste_y = (target - new_h) // 2
         
         # 7. Criar e aplicar sombra
-        shadow = self._create_shadow(product_resized, (target, target))
+        shadow_mask = self._create_shadow(product_resized, (target, target))
         shadow_x = paste_x + self.SHADOW_OFFSET[0]
         shadow_y = paste_y + self.SHADOW_OFFSET[1]
         
-        # Compor sombra no canvas
-        canvas.paste(shadow, (shadow_x, shadow_y), shadow)
+        # Compor sombra no canvas (preto com a máscara de opacidade)
+        canvas.paste(self.SHADOW_COLOR, (shadow_x, shadow_y), shadow_mask)
         
         # 8. Colar produto sobre a sombra
         canvas.paste(product_resized, (paste_x, paste_y), product_resized)
@@ -119,19 +129,29 @@ class ImageComposer:
     
     def compose_from_bytes(
         self,
-        image_bytes: bytes,
+        image_bytes: Union[bytes, Image.Image, np.ndarray],
         target_size: Optional[int] = None
     ) -> bytes:
         """
         Versão para API: recebe e retorna bytes.
 
+        Aceita também imagem PIL ou array numpy (HxWx4) já decodificados,
+        evitando re-encode/decode de PNG entre estágios do pipeline.
+
         Args:
-            image_bytes: PNG com transparência (bytes)
+            image_bytes: PNG com transparência (bytes, PIL.Image ou ndarray)
             target_size: Tamanho do output
 
         Returns:
             PNG final composto (bytes)
         """
+        if not isinstance(image_bytes, bytes):
+            result = self.compose_white_background(self._as_image(image_bytes), target_size)
+            try:
+                return self.to_png_bytes(result)
+            finally:
+                result.close()
+
         # Carregar imagem com context manager para evitar leak
         with BytesIO(image_bytes) as input_buffer:
             input_image = Image.open(input_buffer)
@@ -141,17 +161,83 @@ class ImageComposer:
                 result = self.compose_white_background(input_image, target_size)
 
                 # Converter para bytes
-                with BytesIO() as output:
-                    result.save(output, format='PNG', optimize=True)
-                    return output.getvalue()
+                return self.to_png_bytes(result)
             finally:
                 # Fechar imagens PIL explicitamente
                 input_image.close()
                 result.close()
+
+    def compose_from_bytes_raw(
+        self,
+        image_bytes: Union[bytes, Image.Image, np.ndarray],
+        target_size: Optional[int] = None
+    ) -> Tuple[bytes, Tuple[int, int], str]:
+        """
+        Variante de compose_from_bytes que devolve pixels crus, sem PNG.
+
+        Para verificações internas/testes: o chamador reconstrói a imagem com
+        Image.frombuffer(mode, size, raw, 'raw', mode, 0, 1), sem passar
+        pelo zlib do encode nem do decode.
+
+        Args:
+            image_bytes: PNG com transparência (bytes, PIL.Image ou ndarray)
+            target_size: Tamanho do output
+
+        Returns:
+            Tuple (raw_bytes, (width, height), mode)
+        """
+        if isinstance(image_bytes, bytes):
+            with BytesIO(image_bytes) as input_buffer, Image.open(input_buffer) as input_image:
+                result = self.compose_white_background(input_image, target_size)
+        else:
+            result = self.compose_white_background(self._as_image(image_bytes), target_size)
+
+        try:
+            return image_to_raw_bytes(result), result.size, result.mode
+        finally:
+            result.close()
+
+    def to_png_bytes(self, image: Image.Image) -> bytes:
+        """
+        Serializa imagem composta em PNG.
+
+        compress_level=1: o deflate é o hot loop do encode PNG; em conteúdo
+        fotográfico os níveis mais altos (e optimize) custam várias vezes
+        mais CPU para um ganho pequeno de tamanho.
+
+        Args:
+            image: Imagem composta
+
+        Returns:
+            PNG (bytes)
+        """
+        return encode_image(image, format='PNG', compress_level=1)
+
+    def to_webp_bytes(self, image: Image.Image, quality: int = 92) -> bytes:
+        """
+        Serializa imagem composta em WebP lossy.
+
+        Para fundo branco + produto, ~5-10x menor que PNG com qualidade
+        visual equivalente, e o encode é mais rápido que o zlib do PNG.
+
+        Args:
+            image: Imagem composta
+            quality: Qualidade WebP (0-100)
+
+        Returns:
+            WebP (bytes)
+        """
+        return encode_image(image, format='WEBP', quality=quality, method=4)
     
     # ==========================================================================
     # Métodos Privados
     # ==========================================================================
+
+    def _as_image(self, image: Union[Image.Image, np.ndarray]) -> Image.Image:
+        """Converte ndarray (view zero-copy quando contíguo) em PIL.Image."""
+        if isinstance(image, np.ndarray):
+            return Image.fromarray(image)
+        return image
     
     def _get_content_bbox(self, image: Image.Image) -> Optional[Tuple[int, int, int, int]]:
         """
@@ -171,6 +257,29 @@ class ImageComposer:
         alpha = image.split()[-1]  # Canal A
         return alpha.getbbox()
     
+    def _resize_product(self, product: Image.Image, size: Tuple[int, int]) -> Image.Image:
+        """
+        Redimensiona o produto com LANCZOS, pré-reduzindo fotos grandes.
+        
+        Com reducing_gap o Pillow reduz primeiro por fator inteiro (box,
+        barato) e aplica o LANCZOS só sobre a imagem já menor. Em RGBA o
+        resize() do Pillow converte para alpha pré-multiplicado e ignora
+        reducing_gap, então a conversão é feita aqui (mesmo custo).
+        
+        Args:
+            product: Imagem do produto recortada
+            size: Tamanho final (width, height)
+            
+        Returns:
+            Produto redimensionado (mesmo modo da entrada)
+        """
+        if product.mode != 'RGBA':
+            return product.resize(size, Image.Resampling.LANCZOS, reducing_gap=self.RESIZE_REDUCING_GAP)
+        
+        premultiplied = product.convert('RGBa')
+        resized = premultiplied.resize(size, Image.Resampling.LANCZOS, reducing_gap=self.RESIZE_REDUCING_GAP)
+        return resized.convert('RGBA')
+    
     def _calculate_scale(
         self, 
         product_w: int, 
@@ -204,38 +313,28 @@ class ImageComposer:
         canvas_size: Tuple[int, int]
     ) -> Image.Image:
         """
-        Cria sombra suave do produto.
+        Cria máscara da sombra suave do produto.
+        
+        A sombra é cor sólida (SHADOW_COLOR), então só a opacidade precisa
+        ser calculada: o blur roda em um único canal (L) em vez de RGBA.
         
         Args:
             product: Imagem RGBA do produto redimensionado
             canvas_size: Tamanho do canvas (width, height)
             
         Returns:
-            Imagem RGBA com sombra (para compor via paste com mask)
+            Máscara L com a opacidade da sombra (para paste de SHADOW_COLOR)
         """
-        # Criar imagem para sombra (mesmo tamanho do produto)
-        shadow = Image.new('RGBA', product.size, (0, 0, 0, 0))
-        
-        # Desenhar forma sólida preta onde tem conteúdo
         if product.mode == 'RGBA':
-            # Usar alpha do produto como máscara
-            alpha = product.split()[-1]
-            
-            # Criar sombra com opacidade configurada
-            shadow_layer = Image.new('RGBA', product.size, (0, 0, 0, self.SHADOW_OPACITY))
-            shadow.paste(shadow_layer, mask=alpha)
+            # Alpha do produto escalado pela opacidade configurada
+            alpha = product.getchannel('A')
+            shadow = alpha.point(_opacity_lut(self.SHADOW_OPACITY))
         else:
-            # Fallback: preencher retângulo
-            draw = ImageDraw.Draw(shadow)
-            draw.rectangle(
-                [(0, 0), product.size],
-                fill=(0, 0, 0, self.SHADOW_OPACITY)
-            )
+            # Fallback: retângulo sólido
+            shadow = Image.new('L', product.size, self.SHADOW_OPACITY)
         
         # Aplicar blur gaussiano
-        shadow = shadow.filter(ImageFilter.GaussianBlur(radius=self.SHADOW_BLUR))
-        
-        return shadow
+        return shadow.filter(ImageFilter.GaussianBlur(radius=self.SHADOW_BLUR))
 
 
 # =============================================================================
@@ -10,20 +10,26 @@ Orquestra o pipeline completo de processamento de imagem:
 Todas as versões são registradas na tabela 'images'.
 """
 
+import time
 import uuid
+import hashlib
 import threading
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any
 from dataclasses import dataclass, field
 from io import BytesIO
 
 from PIL import Image
-from rembg import remove
+from rembg import remove, new_session
 
 from app.services.image_composer import image_composer
 from app.services.husk_layer import husk_layer, QualityReport
-from app.database import get_supabase_client, create_image
+from app.database import (
+    get_supabase_client, build_storage_public_url,
+    create_images, get_images_by_content_hash
+)
 from app.config import settings
+from app.utils import image_to_bytes
 
 
 # =============================================================================
@@ -36,6 +42,90 @@ BUCKETS = {
     "processed": "processed-images"
 }
 
+# Entregável final em WebP lossy: bem menor que PNG e encode mais rápido.
+# Original e segmented seguem PNG (segmented precisa do alpha sem perdas).
+FILE_EXTENSIONS = {
+    "original": "png",
+    "segmented": "png",
+    "processed": "webp"
+}
+PROCESSED_WEBP_QUALITY = 92
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp"
+}
+
+# Prefixo dos paths no storage: epoch em ms + entropia (evita colisão
+# entre execuções concorrentes do mesmo produto no mesmo segundo)
+STORAGE_TIMESTAMP_FORMAT = "{ms:013d}_{suffix}"
+
+# Threads para I/O de rede em paralelo (ex: deletes do rollback por bucket)
+IO_POOL_WORKERS = 4
+
+# Guard nativo do Pillow contra decompression bombs (DecompressionBombError)
+Image.MAX_IMAGE_PIXELS = settings.MAX_IMAGE_PIXELS
+
+
+def _storage_timestamp() -> str:
+    """Gera prefixo único para os arquivos de uma execução do pipeline."""
+    return STORAGE_TIMESTAMP_FORMAT.format(
+        ms=time.time_ns() // 1_000_000,
+        suffix=uuid.uuid4().hex[:6]
+    )
+
+
+# =============================================================================
+# rembg Session
+# =============================================================================
+
+_rembg_session = None
+_rembg_session_lock = threading.Lock()
+
+
+def get_rembg_session():
+    """
+    Retorna a sessão ONNX do rembg, criada uma única vez (lazy).
+
+    Sem sessão explícita, remove() recria o InferenceSession a cada chamada.
+    Providers sem suporte no onnxruntime instalado são ignorados pelo rembg,
+    então CUDA é usado quando disponível e CPU caso contrário.
+    """
+    global _rembg_session
+    if _rembg_session is None:
+        with _rembg_session_lock:
+            if _rembg_session is None:
+                _rembg_session = new_session(
+                    settings.REMBG_MODEL,
+                    providers=settings.REMBG_PROVIDERS
+                )
+                print(f"[PIPELINE] ✓ Sessão rembg criada: {settings.REMBG_MODEL} {_rembg_session.providers}")
+    return _rembg_session
+
+
+# Em CPU cada run do onnxruntime já ocupa todos os cores (intra-op threads):
+# inferências concorrentes (workers + /process) só disputam CPU entre si.
+_rembg_inference_lock = threading.Lock()
+
+
+def remove_background(data):
+    """
+    Executa rembg.remove() com a sessão compartilhada.
+
+    Com CUDA as chamadas seguem concorrentes; só em CPU são serializadas.
+
+    Args:
+        data: Imagem (bytes ou PIL.Image)
+
+    Returns:
+        Recorte RGBA no mesmo tipo da entrada (bytes ou PIL.Image)
+    """
+    session = get_rembg_session()
+    if "CUDAExecutionProvider" in session.providers:
+        return remove(data, session=session)
+    with _rembg_inference_lock:
+        return remove(data, session=session)
+
 
 # =============================================================================
 # Data Classes
@@ -52,12 +142,14 @@ class PipelineResult:
         images: Dict com info de cada imagem {type: {id, bucket, path, url}}
         quality_report: Relatório de qualidade (se processado)
         error: Mensagem de erro (se falhou)
+        stage_timings: Duração de cada estágio em ms {stage: ms}
     """
     success: bool
     product_id: str
     images: Dict[str, Dict[str, Any]] = field(default_factory=dict)
     quality_report: Optional[QualityReport] = None
     error: Optional[str] = None
+    stage_timings: Dict[str, float] = field(default_factory=dict)
 
     def to_dict(self) -> dict:
         """Converte para dicionário serializável."""
@@ -66,7 +158,8 @@ class PipelineResult:
             "product_id": self.product_id,
             "images": self.images,
             "quality_report": self.quality_report.to_dict() if self.quality_report else None,
-            "error": self.error
+            "error": self.error,
+            "stage_timings": self.stage_timings
         }
 
 
@@ -86,6 +179,11 @@ class ImagePipelineSync:
         """Inicializa o pipeline com thread-safe client loading."""
         self._client = None
         self._client_lock = threading.Lock()
+        # Executor compartilhado para I/O de rede em paralelo (rollback)
+        self._io_pool = ThreadPoolExecutor(
+            max_workers=IO_POOL_WORKERS,
+            thread_name_prefix="pipeline-io"
+        )
 
     @property
     def client(self):
@@ -96,6 +194,26 @@ class ImagePipelineSync:
                 if self._client is None:
                     self._client = get_supabase_client()
         return self._client
+
+    def warmup(self) -> bool:
+        """
+        Abre as conexões HTTP do client antes do primeiro request.
+
+        O client mantém sessões httpx persistentes (keep-alive) para
+        storage e PostgREST; uma chamada leve no startup paga o handshake
+        TLS/DNS fora do caminho crítico do /process.
+
+        Returns:
+            True se a conexão foi estabelecida
+        """
+        try:
+            self.client.storage.list_buckets()
+            self.client.table('images').select('id').limit(1).execute()
+            print("[PIPELINE] ✓ Conexões Supabase pré-aquecidas")
+            return True
+        except Exception as e:
+            print(f"[PIPELINE] ⚠️ Warmup falhou (não bloqueante): {e}")
+            return False
     
     # ==========================================================================
     # Método Principal
@@ -130,11 +248,13 @@ class ImagePipelineSync:
             images={}
         )
 
-        timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        timestamp = _storage_timestamp()
 
         # Lista de arquivos uploadados para rollback em caso de erro
         uploaded_files: list[tuple[str, str]] = []  # [(bucket, path), ...]
 
+        clock = time.perf_counter()
+
         try:
             print(f"[PIPELINE] Iniciando processamento para produto {product_id}")
 
@@ -142,27 +262,16 @@ class ImagePipelineSync:
             # STAGE 0: Validação de Segurança (DoS Protection)
             # =================================================================
             print("[PIPELINE] Stage 0: Validando arquivo...")
+            self._validate_input(image_bytes)
+            clock = self._record_timing(result, "validate_input", clock)
 
-            # Validar tamanho do arquivo
-            file_size = len(image_bytes)
-            if file_size > settings.MAX_FILE_SIZE_BYTES:
-                size_mb = file_size / (1024 * 1024)
-                raise ValueError(
-                    f"Arquivo muito grande: {size_mb:.1f}MB. "
-                    f"Limite: {settings.MAX_FILE_SIZE_MB}MB"
-                )
-
-            # Validar dimensões da imagem (previne memory exhaustion)
-            with BytesIO(image_bytes) as img_buffer:
-                with Image.open(img_buffer) as img:
-                    width, height = img.size
-                    max_dim = max(width, height)
-                    if max_dim > settings.MAX_IMAGE_DIMENSION:
-                        raise ValueError(
-                            f"Imagem muito grande: {width}x{height}px. "
-                            f"Dimensão máxima: {settings.MAX_IMAGE_DIMENSION}px"
-                        )
-                    print(f"[PIPELINE] ✓ Validação OK: {file_size/1024:.1f}KB, {width}x{height}px")
+            # Dedup: re-upload idêntico reutiliza o resultado anterior
+            content_sha256 = self._content_hash(image_bytes)
+            if content_sha256:
+                cached = self._reuse_previous_result(content_sha256, product_id, user_id)
+                if cached:
+                    return cached
+                clock = self._record_timing(result, "dedup_lookup", clock)
 
             # =================================================================
             # STAGE 1: Upload Original
@@ -178,38 +287,26 @@ class ImagePipelineSync:
 
             if original_url:
                 uploaded_files.append((BUCKETS["original"], original_path))
-                original_record = self._create_image_record(
-                    product_id=product_id,
-                    image_type="original",
-                    bucket=BUCKETS["original"],
-                    path=original_path,
-                    user_id=user_id
-                )
-
                 result.images["original"] = {
-                    "id": original_record.get("id") if original_record else None,
+                    "id": None,  # Preenchido no insert em lote ao final
                     "bucket": BUCKETS["original"],
                     "path": original_path,
                     "url": original_url
                 }
                 print(f"[PIPELINE] ✓ Original salvo: {original_path}")
+            clock = self._record_timing(result, "upload_original", clock)
 
             # =================================================================
             # STAGE 2: Segmentação (rembg)
             # =================================================================
             print("[PIPELINE] Stage 2: Removendo fundo...")
 
-            # Remover fundo usando rembg com tratamento de erro específico
-            try:
-                segmented_bytes = remove(image_bytes)
-            except MemoryError as e:
-                raise RuntimeError(f"Memória insuficiente para processar imagem: {e}")
-            except Exception as e:
-                # rembg pode falhar por vários motivos: modelo não carregado, imagem corrompida, etc.
-                raise RuntimeError(f"Erro na segmentação (rembg): {e}")
-
-            if not segmented_bytes:
-                raise RuntimeError("Segmentação retornou imagem vazia")
+            # rembg recebe/retorna PIL.Image: a imagem segmentada segue
+            # decodificada para a composição, PNG só para o upload
+            segmented_image = self._segment(image_bytes)
+            clock = self._record_timing(result, "segment", clock)
+            segmented_bytes = image_to_bytes(segmented_image, format="PNG")
+            clock = self._record_timing(result, "encode_segmented", clock)
 
             segmented_path = f"{product_id}/{timestamp}_segmented.png"
             segmented_url = self._upload_to_storage(
@@ -220,21 +317,14 @@ class ImagePipelineSync:
 
             if segmented_url:
                 uploaded_files.append((BUCKETS["segmented"], segmented_path))
-                segmented_record = self._create_image_record(
-                    product_id=product_id,
-                    image_type="segmented",
-                    bucket=BUCKETS["segmented"],
-                    path=segmented_path,
-                    user_id=user_id
-                )
-
                 result.images["segmented"] = {
-                    "id": segmented_record.get("id") if segmented_record else None,
+                    "id": None,  # Preenchido no insert em lote ao final
                     "bucket": BUCKETS["segmented"],
                     "path": segmented_path,
                     "url": segmented_url
                 }
                 print(f"[PIPELINE] ✓ Segmentado salvo: {segmented_path}")
+            clock = self._record_timing(result, "upload_segmented", clock)
 
             # =================================================================
             # STAGE 3: Composição (fundo branco)
@@ -242,9 +332,16 @@ class ImagePipelineSync:
             print("[PIPELINE] Stage 3: Compondo fundo branco...")
 
             # Compor com fundo branco usando image_composer
-            processed_bytes = image_composer.compose_from_bytes(segmented_bytes)
+            # Mantém a imagem composta decodificada para a validação (Stage 4)
+            processed_image = image_composer.compose_white_background(segmented_image)
+            segmented_image.close()
+            clock = self._record_timing(result, "compose", clock)
+            processed_bytes = image_composer.to_webp_bytes(
+                processed_image, quality=PROCESSED_WEBP_QUALITY
+            )
+            clock = self._record_timing(result, "encode_processed", clock)
 
-            processed_path = f"{product_id}/{timestamp}_processed.png"
+            processed_path = f"{product_id}/{timestamp}_processed.{FILE_EXTENSIONS['processed']}"
             processed_url = self._upload_to_storage(
                 bucket=BUCKETS["processed"],
                 path=processed_path,
@@ -253,29 +350,23 @@ class ImagePipelineSync:
 
             if processed_url:
                 uploaded_files.append((BUCKETS["processed"], processed_path))
+            clock = self._record_timing(result, "upload_processed", clock)
 
             # =================================================================
             # STAGE 4: Validação de Qualidade
             # =================================================================
             print("[PIPELINE] Stage 4: Validando qualidade...")
 
-            quality_report = husk_layer.validate_from_bytes(processed_bytes)
+            quality_report = husk_layer.validate_image(processed_image)
+            processed_image.close()
             result.quality_report = quality_report
+            clock = self._record_timing(result, "validate_quality", clock)
 
             quality_score = quality_report.score if quality_report else None
 
             if processed_url:
-                processed_record = self._create_image_record(
-                    product_id=product_id,
-                    image_type="processed",
-                    bucket=BUCKETS["processed"],
-                    path=processed_path,
-                    user_id=user_id,
-                    quality_score=quality_score
-                )
-
                 result.images["processed"] = {
-                    "id": processed_record.get("id") if processed_record else None,
+                    "id": None,  # Preenchido no insert em lote ao final
                     "bucket": BUCKETS["processed"],
                     "path": processed_path,
                     "url": processed_url,
@@ -283,6 +374,12 @@ class ImagePipelineSync:
                 }
                 print(f"[PIPELINE] ✓ Processado salvo: {processed_path}")
             
+            # =================================================================
+            # Registro na tabela images (1 INSERT em lote)
+            # =================================================================
+            self._register_images(result, user_id, content_sha256)
+            clock = self._record_timing(result, "register_images", clock)
+
             # =================================================================
             # Sucesso
             # =================================================================
@@ -305,6 +402,143 @@ class ImagePipelineSync:
     # Métodos Auxiliares
     # ==========================================================================
 
+    def _record_timing(self, result: PipelineResult, stage: str, started: float) -> float:
+        """
+        Registra duração do estágio em result.stage_timings (ms).
+
+        Args:
+            result: Resultado do pipeline
+            stage: Nome do estágio
+            started: perf_counter() do início do estágio
+
+        Returns:
+            perf_counter() atual (início do próximo estágio)
+        """
+        now = time.perf_counter()
+        elapsed_ms = (now - started) * 1000
+        result.stage_timings[stage] = round(elapsed_ms, 1)
+        print(f"[PIPELINE] stage={stage} ms={elapsed_ms:.1f}")
+        return now
+
+    def _validate_input(self, image_bytes: bytes) -> tuple[int, int, int]:
+        """
+        Stage 0: valida tamanho e dimensões (DoS Protection).
+
+        Returns:
+            (file_size, width, height)
+
+        Raises:
+            ValueError: Se arquivo ou dimensões excederem os limites
+        """
+        # Validar tamanho do arquivo
+        file_size = len(image_bytes)
+        if file_size > settings.MAX_FILE_SIZE_BYTES:
+            size_mb = file_size / (1024 * 1024)
+            raise ValueError(
+                f"Arquivo muito grande: {size_mb:.1f}MB. "
+                f"Limite: {settings.MAX_FILE_SIZE_MB}MB"
+            )
+
+        # Validar dimensões da imagem (previne memory exhaustion)
+        # Image.open é lazy: lê apenas o header, sem decodificar pixels
+        img = Image.open(BytesIO(image_bytes))
+        width, height = img.size
+        img.close()
+
+        max_dim = max(width, height)
+        if max_dim > settings.MAX_IMAGE_DIMENSION:
+            raise ValueError(
+                f"Imagem muito grande: {width}x{height}px. "
+                f"Dimensão máxima: {settings.MAX_IMAGE_DIMENSION}px"
+            )
+        print(f"[PIPELINE] ✓ Validação OK: {file_size/1024:.1f}KB, {width}x{height}px")
+        return file_size, width, height
+
+    def _segment(self, image_bytes: bytes) -> Image.Image:
+        """
+        Stage 2: remove fundo usando rembg com tratamento de erro específico.
+
+        A imagem é decodificada uma vez e passada como PIL.Image: o rembg
+        devolve o recorte RGBA sem re-encodar PNG internamente.
+
+        Returns:
+            Imagem RGBA segmentada
+
+        Raises:
+            RuntimeError: Se a segmentação falhar ou retornar vazio
+        """
+        try:
+            with Image.open(BytesIO(image_bytes)) as source:
+                source.load()
+                segmented_image = remove_background(source)
+        except MemoryError as e:
+            raise RuntimeError(f"Memória insuficiente para processar imagem: {e}")
+        except Exception as e:
+            # rembg pode falhar por vários motivos: modelo não carregado, imagem corrompida, etc.
+            raise RuntimeError(f"Erro na segmentação (rembg): {e}")
+
+        if segmented_image is None:
+            raise RuntimeError("Segmentação retornou imagem vazia")
+
+        return segmented_image
+
+    def _content_hash(self, image_bytes: bytes) -> Optional[str]:
+        """SHA-256 hex do upload, ou None se o dedup estiver desativado."""
+        if not settings.PIPELINE_DEDUP_ENABLED:
+            return None
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    def _reuse_previous_result(
+        self,
+        content_sha256: str,
+        product_id: str,
+        user_id: str
+    ) -> Optional[PipelineResult]:
+        """
+        Reaproveita o resultado de um upload anterior com o mesmo conteúdo.
+
+        Só considera execuções do próprio produto: os registros e os
+        arquivos do storage já pertencem a ele, então nada é copiado nem
+        registrado de novo.
+
+        Returns:
+            PipelineResult pronto ou None se não houver resultado completo
+        """
+        rows = get_images_by_content_hash(
+            content_sha256, product_id, user_id, client=self.client
+        )
+
+        # Mais recentes primeiro: uma linha por tipo
+        previous: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            previous.setdefault(row["type"], row)
+
+        if "processed" not in previous:
+            return None
+
+        print(f"[PIPELINE] ♻️ Conteúdo já processado para o produto {product_id}, reutilizando")
+
+        quality_score = previous["processed"].get("quality_score")
+        result = PipelineResult(success=True, product_id=product_id, images={})
+
+        for image_type, row in previous.items():
+            result.images[image_type] = {
+                "id": row.get("id"),
+                "bucket": row["storage_bucket"],
+                "path": row["storage_path"],
+                "url": build_storage_public_url(row["storage_bucket"], row["storage_path"])
+            }
+
+        if quality_score is not None:
+            result.images["processed"]["quality_score"] = quality_score
+            result.quality_report = QualityReport(
+                score=quality_score,
+                passed=quality_score >= husk_layer.PASS_THRESHOLD,
+                details={"reused_previous_run": True}
+            )
+
+        return result
+
     def _rollback_uploads(self, uploaded_files: list[tuple[str, str]]) -> None:
         """
         Remove arquivos já uploadados em caso de falha no pipeline.
@@ -316,13 +550,26 @@ class ImagePipelineSync:
             Erros de remoção são logados mas não propagados,
             pois o pipeline já está em estado de erro.
         """
+        # Agrupa por bucket: remove() aceita lista, 1 request por bucket
+        paths_by_bucket: Dict[str, list[str]] = {}
         for bucket, path in uploaded_files:
+            paths_by_bucket.setdefault(bucket, []).append(path)
+
+        def remove_bucket_files(bucket: str, paths: list[str]) -> None:
             try:
-                self.client.storage.from_(bucket).remove([path])
-                print(f"[PIPELINE] ✓ Rollback: removido {bucket}/{path}")
+                self.client.storage.from_(bucket).remove(paths)
+                print(f"[PIPELINE] ✓ Rollback: removido {bucket}/{', '.join(paths)}")
             except Exception as e:
                 # Log mas não falha - já estamos em estado de erro
-                print(f"[PIPELINE] ⚠️ Rollback falhou para {bucket}/{path}: {e}")
+                print(f"[PIPELINE] ⚠️ Rollback falhou para {bucket}/{', '.join(paths)}: {e}")
+
+        # Buckets removidos em paralelo: latência = max, não soma
+        futures = [
+            self._io_pool.submit(remove_bucket_files, bucket, paths)
+            for bucket, paths in paths_by_bucket.items()
+        ]
+        for future in futures:
+            future.result()
 
     def _upload_to_storage(
         self,
@@ -341,71 +588,74 @@ class ImagePipelineSync:
         Returns:
             URL pública do arquivo ou None se falhar
         """
+        # Content-Type pela extensão (processed é WebP)
+        extension = path.rsplit(".", 1)[-1].lower()
+        content_type = CONTENT_TYPES.get(extension, "image/png")
+
         try:
             # Upload
             response = self.client.storage.from_(bucket).upload(
                 path=path,
                 file=data,
-                file_options={"content-type": "image/png"}
+                file_options={"content-type": content_type}
             )
             
-            # Gerar URL pública
-            url_response = self.client.storage.from_(bucket).get_public_url(path)
-            
-            return url_response
+            # URL pública montada localmente (mesmo formato do SDK),
+            # sem chamar get_public_url a cada upload
+            return build_storage_public_url(bucket, path)
             
         except Exception as e:
             print(f"[PIPELINE] ⚠️ Erro no upload ({bucket}/{path}): {str(e)}")
             return None
     
-    def _create_image_record(
+    def _register_images(
         self,
-        product_id: str,
-        image_type: str,
-        bucket: str,
-        path: str,
+        result: PipelineResult,
         user_id: str,
-        quality_score: Optional[int] = None
-    ) -> Optional[Dict[str, Any]]:
+        content_sha256: Optional[str] = None
+    ) -> None:
         """
-        Registra imagem na tabela images.
+        Registra todas as imagens do resultado na tabela images.
+        
+        Um único INSERT em lote (1 round-trip PostgREST) em vez de um
+        por estágio. Preenche result.images[type]["id"] com os ids.
         
         Args:
-            product_id: UUID do produto
-            image_type: Tipo (original, segmented, processed)
-            bucket: Nome do bucket
-            path: Caminho no storage
+            result: Resultado com images {type: {bucket, path, ...}}
             user_id: UUID do usuário
-            quality_score: Score de qualidade (0-100)
+            content_sha256: Hash da imagem original (dedup)
             
-        Returns:
-            Dict com dados do registro ou None se falhar
+        Note:
+            Erros são logados mas não propagados; ids ficam None.
         """
+        image_types = list(result.images)
+        if not image_types:
+            return
+        
         try:
             # Usar função do database.py
-            record = create_image(
-                product_id=product_id,
-                type=image_type,
-                bucket=bucket,
-                path=path,
-                user_id=user_id
+            records = create_images(
+                [
+                    {
+                        "product_id": result.product_id,
+                        "type": image_type,
+                        "bucket": result.images[image_type]["bucket"],
+                        "path": result.images[image_type]["path"],
+                        "user_id": user_id,
+                        "quality_score": result.images[image_type].get("quality_score"),
+                        "content_sha256": content_sha256
+                    }
+                    for image_type in image_types
+                ],
+                client=self.client
             )
             
-            # Atualizar quality_score se fornecido
-            if quality_score is not None and record:
-                try:
-                    self.client.table('images').update({
-                        'quality_score': quality_score
-                    }).eq('id', record['id']).execute()
-                except Exception as e:
-                    # Logar erro mas não falhar o pipeline por causa do score
-                    print(f"[PIPELINE] ⚠️ Erro ao atualizar quality_score: {e}")
-            
-            return record
+            # PostgREST devolve os registros na ordem do INSERT
+            for image_type, record in zip(image_types, records):
+                result.images[image_type]["id"] = record.get("id")
             
         except Exception as e:
-            print(f"[PIPELINE] ⚠️ Erro ao criar registro: {str(e)}")
-            return None
+            print(f"[PIPELINE] ⚠️ Erro ao criar registros: {str(e)}")
 
 
 # =============================================================================
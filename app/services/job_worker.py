@@ -21,25 +21,72 @@ Uso:
 
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor, Future
 from typing import Optional, Tuple, Dict, Any
 from io import BytesIO
 
+from contextlib import closing
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
-from rembg import remove
 
 from app.config import settings
+from app.logging_config import get_logger
+from app.utils import encode_image
 from app.database import (
-    get_job,
     get_next_queued_job,
+    claim_job,
     update_job_progress,
     increment_job_attempt,
     complete_job,
     fail_job,
-    create_image,
+    create_images,
+    build_storage_public_url,
     get_supabase_client
 )
 from app.services.image_composer import ImageComposer
 from app.services.husk_layer import HuskLayer
+from app.services.image_pipeline import (
+    remove_background,
+    FILE_EXTENSIONS,
+    CONTENT_TYPES,
+    PROCESSED_WEBP_QUALITY
+)
+
+
+logger = get_logger(__name__)
+
+
+# =============================================================================
+# remove.bg HTTP Session
+# =============================================================================
+
+REMOVEBG_URL = "https://api.remove.bg/v1.0/removebg"
+
+# Constantes do processo: lidas uma vez no import
+_REMOVEBG_KEY = settings.REMOVEBG_API_KEY
+_REMOVEBG_ENABLED = bool(_REMOVEBG_KEY)
+REMOVEBG_TIMEOUT = (5, 60)  # (connect, read) em segundos
+
+# Sessão única: pool de conexões keep-alive (sem TLS handshake por chamada)
+# e retry automático de 429/5xx antes de cair no retry do próprio job.
+_removebg_session = requests.Session()
+_removebg_session.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=2,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=frozenset(["POST"]),
+            raise_on_status=False
+        )
+    )
+)
 
 
 # =============================================================================
@@ -68,18 +115,49 @@ class JobWorker:
         "done": (95, 100)           # progress: 95% → 100%
     }
     
+    # Formato da imagem final ("webp" ou "png"); mesmo padrão do pipeline síncrono
+    PROCESSED_FORMAT = FILE_EXTENSIONS["processed"]
+    
     # Retry configuration (exponential backoff)
     RETRY_DELAYS = [2, 4, 8]  # segundos
     MAX_ATTEMPTS = 3
     
+    # Prefetch: quantos jobs seguintes podem ter o original baixado antecipadamente
+    PREFETCH_LIMIT = 1
+    
+    # Threads de I/O (prefetch + uploads paralelos)
+    IO_POOL_WORKERS = 4
+    
     def __init__(self):
         """Inicializa worker com serviços de composição e validação."""
         self.composer = ImageComposer()
         self.husk = HuskLayer()
+        
+        # Client Supabase por thread (ver _get_client)
+        self._local = threading.local()
+        
+        # I/O em paralelo: prefetch do próximo job + uploads do job atual
+        self._io_pool = ThreadPoolExecutor(max_workers=self.IO_POOL_WORKERS, thread_name_prefix="worker-io")
+        self._prefetched: Dict[str, Tuple[str, Future]] = {}  # {job_id: (path, future)}
+        self._prefetch_lock = threading.Lock()
+        
+        # Finalização (upload + registro) sobreposta à segmentação do próximo job
+        self._finalize_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker-finalize")
+        self._pending_finalize: Optional[Future] = None
     
     def _get_client(self):
-        """Cria novo client Supabase (evita cache)."""
-        return get_supabase_client()
+        """
+        Retorna o client Supabase da thread atual.
+        
+        Um client por thread (criado sob demanda) mantém as conexões
+        httpx do storage abertas entre jobs, sem handshake TLS a cada
+        download/upload.
+        """
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = get_supabase_client()
+            self._local.client = client
+        return client
     
     def process_job(self, job_id: str) -> bool:
         """
@@ -91,20 +169,75 @@ class JobWorker:
         Returns:
             True se completou com sucesso, False se falhou
         """
-        print(f"[WORKER] ══════════════════════════════════════")
-        print(f"[WORKER] Iniciando job: {job_id}")
-        
-        job = get_job(job_id)
-        if not job:
-            print(f"[WORKER] ✗ Job não encontrado: {job_id}")
+        prepared = self._prepare_job(job_id)
+        if prepared is None:
             return False
+        return self._finalize_job(prepared)
+    
+    def submit_job(self, job_id: str, job: Optional[Dict[str, Any]] = None) -> Optional[Future]:
+        """
+        Processa um job em pipeline: etapas 1-4 (download, segmentação,
+        composição, validação) rodam na thread chamadora; upload, registro
+        e conclusão rodam no executor de finalização.
         
-        if job["status"] not in ("queued", "failed"):
-            print(f"[WORKER] ✗ Job em status inválido: {job['status']}")
-            return False
+        Assim a segmentação do próximo job sobrepõe o I/O de saída deste.
+        No máximo uma finalização fica pendente (backpressure).
+        
+        Args:
+            job_id: UUID do job
+            job: Job já reivindicado via claim_job (opcional)
+            
+        Returns:
+            Future[bool] da finalização, ou None se o job falhou antes dela
+        """
+        prepared = self._prepare_job(job_id, job)
+        
+        # Backpressure: aguarda finalização anterior antes de enfileirar outra
+        pending = self._pending_finalize
+        if pending is not None:
+            pending.exception()  # Só espera; o resultado é tratado por quem submeteu
         
-        # Marcar como processing
-        update_job_progress(job_id, status="processing", current_step="downloading", progress=5)
+        if prepared is None:
+            return None
+        
+        future = self._finalize_pool.submit(self._finalize_job, prepared)
+        self._pending_finalize = future
+        return future
+    
+    def wait_pending(self, timeout: Optional[float] = None) -> None:
+        """Aguarda a finalização pendente (se houver), ex: no shutdown."""
+        pending = self._pending_finalize
+        if pending is not None:
+            try:
+                pending.exception(timeout=timeout)
+            except Exception as e:
+                logger.warning("[WORKER] ⚠️ Finalização pendente não concluiu: %s", e)
+    
+    def _prepare_job(self, job_id: str, job: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Etapas 1-4 do job (download, segmentação, composição, validação).
+        
+        Args:
+            job_id: UUID do job
+            job: Job já reivindicado; se None, reivindica aqui (claim_job)
+        
+        Returns:
+            Contexto para _finalize_job, ou None se o job falhou/é inválido
+        """
+        logger.debug("[WORKER] ══════════════════════════════════════")
+        logger.info("[WORKER] Iniciando job: %s", job_id)
+        
+        # Marcar como processing (atômico: outro worker pode disputar o job)
+        if job is None:
+            job = claim_job(job_id, progress=5)
+            if not job:
+                logger.warning("[WORKER] ✗ Job não encontrado ou já em processamento: %s", job_id)
+                return None
+        
+        # Job atual já saiu da fila: antecipar download do próximo
+        self._io_pool.submit(self._prefetch_next_job)
+        
+        segmented_upload: Optional[Future] = None
         
         try:
             input_data = job.get("input_data", {})
@@ -116,114 +249,177 @@ class JobWorker:
             # ============================================
             # ETAPA 1: Download da imagem original
             # ============================================
-            print(f"[WORKER] 📥 Baixando imagem: {original_path}")
-            update_job_progress(job_id, current_step="downloading", progress=10)
+            logger.debug("[WORKER] 📥 Baixando imagem: %s", original_path)
             
-            original_bytes = self._download_from_storage("raw", original_path)
+            original_bytes = self._take_prefetched(job_id, original_path)
+            if original_bytes is None:
+                original_bytes = self._download_from_storage("raw", original_path)
             
-            update_job_progress(job_id, progress=20)
-            print(f"[WORKER] ✓ Download concluído ({len(original_bytes)} bytes)")
+            logger.info("[WORKER] ✓ Download concluído (%s bytes)", len(original_bytes))
             
             # ============================================
             # ETAPA 2: Segmentação com fallback
             # ============================================
-            print(f"[WORKER] 🔪 Iniciando segmentação...")
-            update_job_progress(job_id, current_step="segmenting", progress=25)
+            logger.debug("[WORKER] 🔪 Iniciando segmentação...")
+            self._update_step(job_id, "segmenting")
             
             segmented_bytes, provider_used = self._segment_with_fallback(original_bytes, job_id)
             
-            update_job_progress(job_id, provider=provider_used, progress=50)
-            print(f"[WORKER] ✓ Segmentação concluída com {provider_used} ({len(segmented_bytes)} bytes)")
+            # Original não é mais usado: libera antes de alocar o canvas
+            # da composição (reduz o pico de memória por job)
+            del original_bytes
+            
+            logger.info(
+                "[WORKER] ✓ Segmentação concluída com %s (%s bytes)",
+                provider_used, len(segmented_bytes)
+            )
+            
+            # Upload do segmented (I/O) já começa, em paralelo com
+            # composição + validação (CPU); _finalize_job aguarda o resultado
+            # (path por job: outro job do mesmo produto não sobrescreve nem remove este)
+            segmented_path = f"{job['created_by']}/{job['product_id']}/{job_id}/segmented.png"
+            segmented_upload = self._io_pool.submit(
+                self._upload_to_storage, "segmented", segmented_path, segmented_bytes
+            )
             
             # ============================================
             # ETAPA 3: Composição (fundo branco)
             # ============================================
-            print(f"[WORKER] 🎨 Iniciando composição...")
-            update_job_progress(job_id, current_step="composing", progress=55)
+            logger.debug("[WORKER] 🎨 Iniciando composição...")
+            self._update_step(job_id, "composing")
             
-            composed_bytes = self.composer.compose_from_bytes(segmented_bytes, target_size=1200)
+            # Decodifica o recorte uma vez; composição e validação trabalham
+            # sobre a imagem em memória e o PNG só é gerado para o upload
+            # (o segmented sobe com os bytes exatos do provider).
+            with Image.open(BytesIO(segmented_bytes)) as segmented_image:
+                segmented_image.load()
+                composed_image = self.composer.compose_white_background(segmented_image, target_size=1200)
+            composed_bytes = self._encode_processed(composed_image)
             
-            update_job_progress(job_id, progress=75)
-            print(f"[WORKER] ✓ Composição concluída ({len(composed_bytes)} bytes)")
+            logger.info("[WORKER] ✓ Composição concluída (%s bytes)", len(composed_bytes))
             
             # ============================================
             # ETAPA 4: Validação (quality score)
             # ============================================
-            print(f"[WORKER] 🔍 Iniciando validação...")
-            update_job_progress(job_id, current_step="validating", progress=78)
+            logger.debug("[WORKER] 🔍 Iniciando validação...")
+            self._update_step(job_id, "validating")
             
-            quality_report = self.husk.validate_from_bytes(composed_bytes)
-            quality_score = quality_report.score
-            quality_passed = quality_report.passed
+            try:
+                quality_report = self.husk.validate_image(composed_image)
+            finally:
+                composed_image.close()
+            
+            status_emoji = "✅" if quality_report.passed else "⚠️"
+            logger.info(
+                "[WORKER] %s Validação: score=%s/100, passed=%s",
+                status_emoji, quality_report.score, quality_report.passed
+            )
+            
+            return {
+                "job_id": job_id,
+                "job": job,
+                "input_data": input_data,
+                "original_path": original_path,
+                "segmented_path": segmented_path,
+                "segmented_upload": segmented_upload,
+                "composed_bytes": composed_bytes,
+                "quality_report": quality_report,
+                "provider_used": provider_used
+            }
             
-            update_job_progress(job_id, progress=85)
-            status_emoji = "✅" if quality_passed else "⚠️"
-            print(f"[WORKER] {status_emoji} Validação: score={quality_score}/100, passed={quality_passed}")
+        except Exception as e:
+            error_msg = str(e)
+            logger.error("[WORKER] ✗ Erro no job %s: %s", job_id, error_msg)
+            if segmented_upload is not None:
+                self._discard_upload(segmented_upload, "segmented", segmented_path)
+            self._handle_failure(job_id, error_msg, job.get("attempts", 0))
+            return None
+    
+    def _finalize_job(self, prepared: Dict[str, Any]) -> bool:
+        """
+        Etapas 5-7 do job (upload, registro no banco, conclusão).
+        
+        Args:
+            prepared: Contexto retornado por _prepare_job
             
+        Returns:
+            True se completou com sucesso, False se falhou
+        """
+        job_id = prepared["job_id"]
+        job = prepared["job"]
+        input_data = prepared["input_data"]
+        original_path = prepared["original_path"]
+        segmented_path = prepared["segmented_path"]
+        # pop: o contexto fica referenciado pelo executor até o fim do job;
+        # payload e future só precisam viver até o upload
+        segmented_upload = prepared.pop("segmented_upload")
+        composed_bytes = prepared.pop("composed_bytes")
+        quality_report = prepared["quality_report"]
+        provider_used = prepared["provider_used"]
+        quality_score = quality_report.score
+        quality_passed = quality_report.passed
+        
+        try:
             # ============================================
             # ETAPA 5: Upload das imagens processadas
             # ============================================
-            print(f"[WORKER] 📤 Salvando imagens no storage...")
-            update_job_progress(job_id, current_step="saving", progress=88)
+            logger.debug("[WORKER] 📤 Salvando imagens no storage...")
+            self._update_step(job_id, "saving")
             
             product_id = job["product_id"]
             user_id = job["created_by"]
             
-            client = self._get_client()
-            
-            # Upload segmented
-            segmented_path = f"{user_id}/{product_id}/segmented.png"
-            self._upload_to_storage(client, "segmented", segmented_path, segmented_bytes)
-            segmented_url = client.storage.from_("segmented").get_public_url(segmented_path)
+            processed_path = f"{user_id}/{product_id}/{job_id}/processed.{self.PROCESSED_FORMAT}"
             
-            update_job_progress(job_id, progress=92)
+            # Segmented já está subindo desde a segmentação; processed em paralelo
+            processed_upload = self._io_pool.submit(
+                self._upload_to_storage, "processed-images", processed_path, composed_bytes,
+                CONTENT_TYPES[self.PROCESSED_FORMAT]
+            )
+            segmented_upload.result()
+            processed_upload.result()
+            del composed_bytes, segmented_upload, processed_upload
             
-            # Upload processed
-            processed_path = f"{user_id}/{product_id}/processed.png"
-            self._upload_to_storage(client, "processed-images", processed_path, composed_bytes)
-            processed_url = client.storage.from_("processed-images").get_public_url(processed_path)
+            # URLs públicas pelo template do projeto (sem passar pelo SDK)
+            segmented_url = build_storage_public_url("segmented", segmented_path)
+            processed_url = build_storage_public_url("processed-images", processed_path)
             
-            update_job_progress(job_id, progress=95)
-            print(f"[WORKER] ✓ Imagens salvas no storage")
+            logger.info("[WORKER] ✓ Imagens salvas no storage")
             
             # ============================================
             # ETAPA 6: Registrar imagens no banco
             # ============================================
-            print(f"[WORKER] 💾 Registrando no banco...")
+            logger.debug("[WORKER] 💾 Registrando no banco...")
             
-            # Registrar imagem segmentada
+            # Registrar segmented + processed em um único INSERT
             try:
-                segmented_record = create_image(
-                    product_id=product_id,
-                    type="segmented",
-                    bucket="segmented",
-                    path=segmented_path,
-                    user_id=user_id
-                )
-                segmented_image_id = segmented_record.get("id") if segmented_record else None
+                segmented_record, processed_record = create_images([
+                    {
+                        "product_id": product_id,
+                        "type": "segmented",
+                        "bucket": "segmented",
+                        "path": segmented_path,
+                        "user_id": user_id
+                    },
+                    {
+                        "product_id": product_id,
+                        "type": "processed",
+                        "bucket": "processed-images",
+                        "path": processed_path,
+                        "user_id": user_id,
+                        "quality_score": quality_score
+                    }
+                ])
+                segmented_image_id = segmented_record.get("id")
+                processed_image_id = processed_record.get("id")
             except Exception as e:
-                print(f"[WORKER] ⚠️ Erro ao registrar segmented: {str(e)}")
+                logger.warning("[WORKER] ⚠️ Erro ao registrar imagens: %s", e)
                 segmented_image_id = None
-            
-            # Registrar imagem processada
-            try:
-                processed_record = create_image(
-                    product_id=product_id,
-                    type="processed",
-                    bucket="processed-images",
-                    path=processed_path,
-                    user_id=user_id
-                )
-                processed_image_id = processed_record.get("id") if processed_record else None
-            except Exception as e:
-                print(f"[WORKER] ⚠️ Erro ao registrar processed: {str(e)}")
                 processed_image_id = None
             
             # ============================================
-            # ETAPA 7: Completar job
+            # ETAPA 7: Completar job (complete_job grava done/100%)
             # ============================================
-            update_job_progress(job_id, current_step="done", progress=100)
-            
             output_data = {
                 "images": {
                     "original": {
@@ -250,73 +446,151 @@ class JobWorker:
                 "provider_used": provider_used
             }
             
-            complete_job(job_id, output_data)
-            print(f"[WORKER] ══════════════════════════════════════")
-            print(f"[WORKER] ✓ JOB COMPLETO: {job_id}")
-            print(f"[WORKER] ══════════════════════════════════════")
+            complete_job(job_id, output_data, provider=provider_used)
+            logger.debug("[WORKER] ══════════════════════════════════════")
+            logger.info("[WORKER] ✓ JOB COMPLETO: %s", job_id)
+            logger.debug("[WORKER] ══════════════════════════════════════")
             return True
             
         except Exception as e:
             error_msg = str(e)
-            print(f"[WORKER] ✗ Erro no job {job_id}: {error_msg}")
-            return self._handle_failure(job_id, error_msg)
+            logger.error("[WORKER] ✗ Erro no job %s: %s", job_id, error_msg)
+            return self._handle_failure(job_id, error_msg, job.get("attempts", 0))
+    
+    def _update_step(self, job_id: str, step: str) -> None:
+        """
+        Registra transição de etapa com o progresso inicial de STEPS.
+        
+        Progresso é gravado só nas transições (uma escrita por etapa),
+        não em marcos intermediários dentro de cada etapa.
+        """
+        update_job_progress(job_id, current_step=step, progress=self.STEPS[step][0])
+    
+    def _encode_processed(self, image: Image.Image) -> bytes:
+        """Serializa a imagem final no formato de entrega (PROCESSED_FORMAT)."""
+        if self.PROCESSED_FORMAT == "webp":
+            return self.composer.to_webp_bytes(image, quality=PROCESSED_WEBP_QUALITY)
+        return self.composer.to_png_bytes(image)
     
     def _segment_with_fallback(self, image_bytes: bytes, job_id: str) -> Tuple[bytes, str]:
         """
         Segmenta imagem com fallback de providers.
         
         Tenta rembg (self-hosted) primeiro.
-        Remove.bg pode ser adicionado como fallback.
+        Remove.bg entra como fallback quando REMOVEBG_API_KEY está configurada.
         
         Returns:
             (segmented_bytes, provider_used)
         """
-        providers = [
-            ("rembg", self._segment_rembg),
-            # ("remove.bg", self._segment_removebg),  # Descomentarquando tiver API key
-        ]
+        providers = [("rembg", self._segment_rembg)]
+        if _REMOVEBG_ENABLED:
+            providers.append(("remove.bg", self._segment_removebg))
         
         last_error = None
         
         for provider_name, provider_func in providers:
             try:
-                print(f"[WORKER] Tentando segmentação com {provider_name}...")
+                logger.debug("[WORKER] Tentando segmentação com %s...", provider_name)
                 result = provider_func(image_bytes)
                 return result, provider_name
             except Exception as e:
                 last_error = str(e)
-                print(f"[WORKER] ✗ {provider_name} falhou: {last_error}")
+                logger.warning("[WORKER] ✗ %s falhou: %s", provider_name, last_error)
                 continue
         
         # Todos os providers falharam
         raise Exception(f"Segmentação falhou com todos os providers. Último erro: {last_error}")
     
     def _segment_rembg(self, image_bytes: bytes) -> bytes:
-        """Segmentação via rembg (U2NET local)."""
-        return remove(image_bytes)
+        """
+        Segmentação via rembg (U2NET local).
+        
+        Usa a sessão ONNX compartilhada com o pipeline síncrono: sem
+        `session`, o rembg recria a sessão (e recarrega o modelo) a cada
+        chamada.
+        
+        O recorte volta como PIL e é encodado com deflate rápido
+        (encode_image, compress_level=1), em vez do deflate nível 6 que o
+        rembg usa quando recebe bytes.
+        """
+        with Image.open(BytesIO(image_bytes)) as source:
+            source.load()
+            cutout = remove_background(source)
+        try:
+            return encode_image(cutout, format="PNG", compress_level=1)
+        finally:
+            cutout.close()
     
     def _segment_removebg(self, image_bytes: bytes) -> bytes:
         """
         Segmentação via remove.bg API.
-        Requer REMOVEBG_API_KEY no .env
+        Só é chamada com REMOVEBG_API_KEY configurada (_REMOVEBG_ENABLED).
         """
-        api_key = getattr(settings, 'REMOVEBG_API_KEY', None)
-        if not api_key:
-            raise ValueError("REMOVEBG_API_KEY não configurada")
-        
-        import requests
-        
-        response = requests.post(
-            "https://api.remove.bg/v1.0/removebg",
+        response = _removebg_session.post(
+            REMOVEBG_URL,
             files={"image_file": image_bytes},
             data={"size": "auto"},
-            headers={"X-Api-Key": api_key}
+            headers={"X-Api-Key": _REMOVEBG_KEY},
+            timeout=REMOVEBG_TIMEOUT
         )
         
-        if response.status_code != 200:
-            raise Exception(f"remove.bg error: {response.status_code} - {response.text}")
+        # closing(): devolve a conexão ao pool mesmo em erro
+        with closing(response):
+            if response.status_code != 200:
+                raise Exception(f"remove.bg error: {response.status_code} - {response.text}")
+            
+            return response.content
+    
+    def _prefetch_next_job(self) -> None:
+        """
+        Inicia o download do original do próximo job da fila.
+        
+        Mantém no máximo PREFETCH_LIMIT downloads; prefetches de jobs que
+        não foram processados (ex: pegos por outro worker) são descartados.
+        """
+        try:
+            next_job = get_next_queued_job()
+            if not next_job:
+                return
+            
+            next_job_id = next_job["id"]
+            path = (next_job.get("input_data") or {}).get("original_path")
+            if not path:
+                return
+            
+            with self._prefetch_lock:
+                if next_job_id in self._prefetched:
+                    return
+                while len(self._prefetched) >= self.PREFETCH_LIMIT:
+                    # Descarta o mais antigo (dict preserva ordem de inserção)
+                    self._prefetched.pop(next(iter(self._prefetched)))
+                future = self._io_pool.submit(self._download_from_storage, "raw", path)
+                self._prefetched[next_job_id] = (path, future)
+            
+            logger.debug("[WORKER] ⏩ Prefetch iniciado para job %s", next_job_id)
+        except Exception as e:
+            logger.warning("[WORKER] ⚠️ Prefetch falhou (não bloqueante): %s", e)
+    
+    def _take_prefetched(self, job_id: str, path: str) -> Optional[bytes]:
+        """
+        Retorna bytes pré-baixados do job, se houver prefetch válido.
+        
+        Returns:
+            Bytes da imagem ou None (caller faz download normal)
+        """
+        with self._prefetch_lock:
+            entry = self._prefetched.pop(job_id, None)
         
-        return response.content
+        if not entry or entry[0] != path:
+            return None
+        
+        try:
+            data = entry[1].result()
+            logger.info("[WORKER] ✓ Usando original pré-baixado (%s bytes)", len(data))
+            return data
+        except Exception as e:
+            logger.warning("[WORKER] ⚠️ Prefetch inválido, baixando novamente: %s", e)
+            return None
     
     def _download_from_storage(self, bucket: str, path: str) -> bytes:
         """Download de arquivo do Supabase Storage."""
@@ -324,50 +598,82 @@ class JobWorker:
         response = client.storage.from_(bucket).download(path)
         return response
     
-    def _upload_to_storage(self, client, bucket: str, path: str, data: bytes) -> str:
-        """Upload de arquivo para Supabase Storage."""
-        # Tentar remover arquivo existente (se houver)
-        try:
-            client.storage.from_(bucket).remove([path])
-        except:
-            pass  # Ignora se não existir
+    def _upload_to_storage(
+        self,
+        bucket: str,
+        path: str,
+        data: bytes,
+        content_type: str = "image/png"
+    ) -> str:
+        """
+        Upload de arquivo para Supabase Storage.
         
+        x-upsert sobrescreve no servidor um arquivo existente (ex: retry do
+        job) na mesma chamada, sem o remove() prévio. O header vai explícito:
+        nas versões do storage3 aceitas por supabase==2.7.0 o file_options é
+        repassado como headers HTTP e a chave "upsert" é ignorada pelo
+        Storage. O client é resolvido aqui, na thread do pool que faz o
+        upload (clients são por thread).
+        """
+        client = self._get_client()
         client.storage.from_(bucket).upload(
             path=path,
             file=data,
-            file_options={"content-type": "image/png"}
+            file_options={"content-type": content_type, "x-upsert": "true"}
         )
         return path
     
-    def _handle_failure(self, job_id: str, error: str) -> bool:
+    def _discard_upload(self, upload: Future, bucket: str, path: str) -> None:
+        """
+        Descarta o upload antecipado de um job que falhou.
+        
+        Cancela se ainda não começou; senão aguarda o término e remove o
+        arquivo, para não deixar objeto órfão no storage.
+        """
+        if upload.cancel():
+            return
+        
+        try:
+            upload.result()
+        except Exception:
+            return  # Upload falhou: nada a remover
+        
+        try:
+            self._get_client().storage.from_(bucket).remove([path])
+            logger.info("[WORKER] ✓ Upload órfão removido: %s/%s", bucket, path)
+        except Exception as e:
+            logger.warning("[WORKER] ⚠️ Erro ao remover %s/%s: %s", bucket, path, e)
+    
+    def _handle_failure(self, job_id: str, error: str, attempts: int = 0) -> bool:
         """
         Trata falha do job.
         
         Se ainda tem tentativas, volta para fila com backoff.
         Se esgotou tentativas, marca como failed definitivo.
+        
+        Args:
+            job_id: UUID do job
+            error: Mensagem de erro
+            attempts: Tentativas já registradas (do job carregado no início
+                do processamento; evita novo get_job só para o backoff)
         """
-        result = increment_job_attempt(job_id, error, retry_delay_seconds=self._get_retry_delay(job_id))
+        result = increment_job_attempt(job_id, error, retry_delay_seconds=self._get_retry_delay(attempts))
         
         if result and result.get("should_retry"):
             # Ainda pode tentar
             attempt = result.get("attempts", 0)
             max_attempts = result.get("max_attempts", 3)
             
-            print(f"[WORKER] ⏳ Job {job_id} aguardando retry (tentativa {attempt}/{max_attempts})")
+            logger.info("[WORKER] ⏳ Job %s aguardando retry (tentativa %s/%s)", job_id, attempt, max_attempts)
             return False
         else:
             # Esgotou tentativas
             fail_job(job_id, f"Falhou após {self.MAX_ATTEMPTS} tentativas. Último erro: {error}")
-            print(f"[WORKER] ✗ Job {job_id} falhou definitivamente")
+            logger.error("[WORKER] ✗ Job %s falhou definitivamente", job_id)
             return False
     
-    def _get_retry_delay(self, job_id: str) -> int:
+    def _get_retry_delay(self, attempts: int) -> int:
         """Calcula delay para próxima tentativa (exponential backoff)."""
-        job = get_job(job_id)
-        if not job:
-            return self.RETRY_DELAYS[0]
-        
-        attempts = job.get("attempts", 0)
         delay_index = min(attempts, len(self.RETRY_DELAYS) - 1)
         return self.RETRY_DELAYS[delay_index]
 
@@ -381,71 +687,114 @@ class JobWorkerDaemon:
     Daemon que roda em background processando jobs.
     
     Usa threading.Event para shutdown graceful e interruptível.
+    Com num_workers > 1, cada thread tem seu próprio JobWorker e disputa
+    a fila via claim_job (UPDATE condicional), então um job nunca é
+    processado por duas threads.
     
     Uso:
-        daemon = JobWorkerDaemon(poll_interval=2)
+        daemon = JobWorkerDaemon(poll_interval=2, num_workers=2)
         daemon.start()
         # ... aplicação roda ...
-        daemon.stop()  # Aguarda job atual terminar
+        daemon.stop()  # Aguarda jobs atuais terminarem
     """
     
-    def __init__(self, poll_interval: int = 2):
+    # Teto do backoff entre polls com fila vazia (segundos)
+    MAX_POLL_INTERVAL = 30
+    
+    def __init__(self, poll_interval: int = 2, num_workers: int = 1):
         """
         Args:
             poll_interval: Intervalo em segundos entre polls da fila
+                (dobra a cada poll vazio, até MAX_POLL_INTERVAL)
+            num_workers: Threads processando jobs em paralelo
         """
         self.poll_interval = poll_interval
+        self.num_workers = max(1, num_workers)
         self.running = False
-        self.thread = None
-        self.worker = JobWorker()
+        self.threads = []
+        self.workers = [JobWorker() for _ in range(self.num_workers)]
+        self.worker = self.workers[0]
         self.jobs_processed = 0
         self.jobs_failed = 0
-        self._current_job_id = None  # Rastreia job em processamento
+        self._current_jobs: Dict[str, str] = {}  # {thread_name: job_id} em processamento
         self._stop_event = threading.Event()  # Evento para shutdown graceful
+        self._wake_event = threading.Event()  # Novo job enfileirado (notify)
+        self._stats_lock = threading.Lock()
+    
+    @property
+    def _current_job_id(self) -> Optional[str]:
+        """Primeiro job em processamento (compatibilidade com single-thread)."""
+        return next(iter(self._current_jobs.values()), None)
     
     def start(self):
-        """Inicia daemon em thread separada."""
+        """Inicia daemon em threads separadas (uma por worker)."""
         if self.running:
-            print("[DAEMON] Já está rodando")
+            logger.warning("[DAEMON] Já está rodando")
             return
         
         self.running = True
         self._stop_event.clear()
+        self._wake_event.clear()
         
         # daemon=False permite shutdown graceful (aguarda job atual)
-        self.thread = threading.Thread(
-            target=self._run_loop,
-            daemon=False,
-            name="JobWorkerDaemon"
-        )
-        self.thread.start()
-        print(f"[DAEMON] ✓ Iniciado (poll_interval={self.poll_interval}s)")
+        self.threads = [
+            threading.Thread(
+                target=self._run_loop,
+                args=(worker,),
+                daemon=False,
+                name="JobWorkerDaemon" if index == 0 else f"JobWorkerDaemon-{index}"
+            )
+            for index, worker in enumerate(self.workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+        logger.info("[DAEMON] ✓ Iniciado (poll_interval=%ss, workers=%s)", self.poll_interval, self.num_workers)
     
     def stop(self, timeout: int = 30):
         """
         Para o daemon gracefully.
         
         Args:
-            timeout: Tempo máximo para aguardar job atual (default 30s)
+            timeout: Tempo máximo para aguardar jobs atuais (default 30s)
         """
         if not self.running:
             return
         
-        print("[DAEMON] Parando (aguardando job atual)...")
+        logger.info("[DAEMON] Parando (aguardando job atual)...")
         self.running = False
-        self._stop_event.set()  # Sinaliza para thread parar
+        self._stop_event.set()  # Sinaliza para threads pararem
+        self._wake_event.set()  # Interrompe esperas de fila vazia
         
-        if self.thread:
-            self.thread.join(timeout=timeout)
-            
-            if self.thread.is_alive():
-                print(f"[DAEMON] ⚠ Timeout! Job {self._current_job_id} ainda processando")
-            else:
-                print(f"[DAEMON] ✓ Parado (processados={self.jobs_processed}, falhas={self.jobs_failed})")
+        deadline = time.monotonic() + timeout
+        for thread in self.threads:
+            thread.join(timeout=max(0, deadline - time.monotonic()))
+        
+        if any(thread.is_alive() for thread in self.threads):
+            logger.warning("[DAEMON] ⚠ Timeout! Jobs %s ainda processando", list(self._current_jobs.values()))
+        else:
+            logger.info("[DAEMON] ✓ Parado (processados=%s, falhas=%s)", self.jobs_processed, self.jobs_failed)
+    
+    def notify(self) -> None:
+        """
+        Avisa que há job novo na fila.
+        
+        Interrompe a espera de fila vazia (e o backoff) sem aguardar o
+        próximo poll. Chamado pelo endpoint que enfileira o job.
+        """
+        self._wake_event.set()
+    
+    def _wait_for_work(self, empty_polls: int) -> None:
+        """Aguarda com backoff exponencial, interrompível por notify()/stop()."""
+        timeout = min(self.poll_interval * (2 ** empty_polls), self.MAX_POLL_INTERVAL)
+        if self._wake_event.wait(timeout=timeout):
+            self._wake_event.clear()
     
-    def _run_loop(self):
-        """Loop principal do daemon com stop event interruptível."""
-        print("[DAEMON] Loop iniciado, aguardando jobs...")
+    def _run_loop(self, worker: JobWorker):
+        """Loop de uma thread do daemon com stop event interruptível."""
+        thread_name = threading.current_thread().name
+        logger.debug("[DAEMON] Loop iniciado (%s), aguardando jobs...", thread_name)
+        
+        empty_polls = 0  # Polls vazios consecutivos (backoff)
         
         while self.running and not self._stop_event.is_set():
             try:
@@ -453,18 +802,27 @@ class JobWorkerDaemon:
                 job = get_next_queued_job()
                 
                 if job:
+                    empty_polls = 0
                     job_id = job["id"]
-                    self._current_job_id = job_id
-                    print(f"[DAEMON] 📋 Encontrou job: {job_id}")
                     
-                    # Processar job
-                    success = self.worker.process_job(job_id)
-                    self._current_job_id = None
+                    # Outra thread/instância pode ter pego o mesmo job
+                    claimed = claim_job(job_id, progress=5)
+                    if not claimed:
+                        continue
+                    
+                    self._current_jobs[thread_name] = job_id
+                    logger.info("[DAEMON] 📋 Encontrou job: %s", job_id)
                     
-                    if success:
-                        self.jobs_processed += 1
+                    # Processar job (finalização segue em background)
+                    future = worker.submit_job(job_id, claimed)
+                    self._current_jobs.pop(thread_name, None)
+                    
+                    if future is None:
+                        self._record_result(False)
                     else:
-                        self.jobs_failed += 1
+                        future.add_done_callback(
+                            lambda f: self._record_result(not f.exception() and f.result())
+                        )
                     
                     # Verificar stop entre jobs
                     if self._stop_event.is_set():
@@ -473,21 +831,35 @@ class JobWorkerDaemon:
                     # Pequena pausa entre jobs
                     self._stop_event.wait(timeout=0.5)  # Interruptível
                 else:
-                    # Sem jobs, aguardar (interruptível pelo stop_event)
-                    self._stop_event.wait(timeout=self.poll_interval)
+                    # Sem jobs: backoff exponencial (interruptível por notify/stop)
+                    self._wait_for_work(empty_polls)
+                    empty_polls = min(empty_polls + 1, 16)
                     
             except Exception as e:
-                print(f"[DAEMON] ✗ Erro no loop: {str(e)}")
+                logger.error("[DAEMON] ✗ Erro no loop: %s", e)
                 self._stop_event.wait(timeout=self.poll_interval)
+        
+        # Não encerrar com upload/registro do último job pela metade
+        worker.wait_pending()
+    
+    def _record_result(self, success: bool) -> None:
+        """Atualiza contadores (chamado pela thread de finalização)."""
+        with self._stats_lock:
+            if success:
+                self.jobs_processed += 1
+            else:
+                self.jobs_failed += 1
     
     def get_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas do daemon."""
         return {
             "running": self.running,
             "current_job": self._current_job_id,
+            "current_jobs": list(self._current_jobs.values()),
             "jobs_processed": self.jobs_processed,
             "jobs_failed": self.jobs_failed,
-            "poll_interval": self.poll_interval
+            "poll_interval": self.poll_interval,
+            "num_workers": self.num_workers
         }
 
 
@@ -496,4 +868,4 @@ class JobWorkerDaemon:
 # =============================================================================
 
 job_worker = JobWorker()
-job_daemon = JobWorkerDaemon(poll_interval=2)
+job_daemon = JobWorkerDaemon(poll_interval=2, num_workers=settings.JOB_WORKER_THREADS)
@@ -6,13 +6,19 @@ Gera PDFs formatados das fichas técnicas de produtos usando ReportLab.
 Uso:
     from app.services.pdf_generator import pdf_generator
     
-    pdf_bytes = pdf_generator.generate(sheet_data, product_data, image_url)
+    pdf_bytes = pdf_generator.generate_bytes(sheet_data, product_data, image_url)
 """
 
+import copy
+import threading
+from functools import partial
+from contextlib import closing
 from io import BytesIO
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, BinaryIO, Callable
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
@@ -20,7 +26,107 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
+    SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, KeepTogether,
+    Image as RLImage
+)
+
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+
+# =============================================================================
+# Seções da Ficha
+# =============================================================================
+# Cada builder recebe o valor da chave em sheet_data e retorna linhas
+# [label, valor] (renderizadas em tabela) ou texto (parágrafo FridaBody).
+
+DIMENSION_FIELDS = (
+    ("altura", "Altura"),
+    ("largura", "Largura"),
+    ("profundidade", "Profundidade"),
+    ("alca", "Alça"),
+)
+
+MATERIAL_FIELDS = (
+    ("principal", "Material Principal"),
+    ("forro", "Forro"),
+    ("ferragens", "Ferragens"),
+    ("ziper", "Zíper"),
+)
+
+SUPPLIER_FIELDS = (
+    ("nome", "Nome"),
+    ("contato", "Contato"),
+    ("cnpj", "CNPJ"),
+    ("prazo_entrega", "Prazo de Entrega"),
+)
+
+
+def _field_rows_builder(
+    fields: Tuple[Tuple[str, str], ...],
+    suffix: str = ""
+) -> Callable[[Dict[str, Any]], List[List[str]]]:
+    """
+    Cria o builder de uma seção de campos fixos.
+    
+    Os campos da seção são conhecidos no import: o builder é um closure
+    com a tupla (chave, label) e o sufixo já ligados, sem despacho por
+    campo em tempo de request.
+    
+    Args:
+        fields: Tupla de (chave, label) na ordem de exibição
+        suffix: Unidade anexada ao valor (ex: " cm")
+    
+    Returns:
+        Função dict → linhas [label, valor] dos campos preenchidos
+    """
+    def build(values: Dict[str, Any]) -> List[List[str]]:
+        rows = []
+        for key, label in fields:
+            value = values.get(key)
+            if value:
+                rows.append([label, f"{value}{suffix}"])
+        return rows
+    
+    return build
+
+
+_build_dimension_rows = _field_rows_builder(DIMENSION_FIELDS, " cm")
+_build_material_rows = _field_rows_builder(MATERIAL_FIELDS)
+_build_supplier_rows = _field_rows_builder(SUPPLIER_FIELDS)
+
+
+def _build_custom_rows(fields: Dict[str, Any]) -> List[List[str]]:
+    """Linhas de campos customizados (chave livre)."""
+    return [[str(key), str(value)] for key, value in fields.items()]
+
+
+def _build_colors_text(colors_list: List[str]) -> str:
+    """Cores separadas por vírgula."""
+    return ", ".join(colors_list)
+
+
+def _build_weight_text(weight_grams: float) -> str:
+    """Peso em gramas e kg."""
+    return f"{weight_grams}g ({weight_grams / 1000:.2f} kg)"
+
+
+def _build_care_text(care_instructions: str) -> str:
+    """Instruções de cuidado (texto livre)."""
+    return care_instructions
+
+
+# (chave em sheet_data, título da seção, builder) - na ordem do PDF
+SECTIONS = (
+    ("dimensions", "Dimensões", _build_dimension_rows),
+    ("materials", "Materiais", _build_material_rows),
+    ("colors", "Cores Disponíveis", _build_colors_text),
+    ("weight_grams", "Peso", _build_weight_text),
+    ("supplier", "Fornecedor", _build_supplier_rows),
+    ("care_instructions", "Instruções de Cuidado", _build_care_text),
+    ("custom_fields", "Informações Adicionais", _build_custom_rows),
 )
 
 
@@ -42,10 +148,104 @@ class TechnicalSheetPDFGenerator:
     FRIDA_LIGHT = colors.HexColor("#f5f5f5")
     FRIDA_BORDER = colors.HexColor("#e0e0e0")
     
+    # Layout (em pontos, calculado uma vez no import)
+    PAGE_MARGIN = 2*cm
+    BLOCK_SPACING = 0.5*cm  # Após identificação e imagem
+    TEXT_SPACING = 0.3*cm  # Após seções de texto corrido
+    
+    # Tabela de informações (label + valor) - estilo montado uma vez no import.
+    # Tupla: a mesma instância é compartilhada por todas as tabelas.
+    _INFO_COL_WIDTHS = (4*cm, 10*cm)
+    _INFO_TABLE_STYLE = TableStyle([
+        # Header styling
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('TEXTCOLOR', (0, 0), (0, -1), FRIDA_BLACK),
+        ('TEXTCOLOR', (1, 0), (1, -1), FRIDA_BODY),
+        # Padding
+        ('TOPPADDING', (0, 0), (-1, -1), 4),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('LEFTPADDING', (0, 0), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+        # Borders
+        ('LINEBELOW', (0, 0), (-1, -1), 0.5, FRIDA_BORDER),
+        # Background alternado
+        ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, FRIDA_LIGHT]),
+        # Alinhamento
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ])
+    
+    # Textos fixos (cabeçalho e títulos de seção) - Paragraph parseado uma vez
+    _STATIC_TEXTS = (
+        ("FRIDA", 'FridaTitle'),
+        ("Ficha Técnica de Produto", 'FridaSubtitle'),
+        ("Identificação", 'FridaSection'),
+        ("Imagem do Produto", 'FridaSection'),
+        ("Dimensões", 'FridaSection'),
+        ("Materiais", 'FridaSection'),
+        ("Cores Disponíveis", 'FridaSection'),
+        ("Peso", 'FridaSection'),
+        ("Fornecedor", 'FridaSection'),
+        ("Instruções de Cuidado", 'FridaSection'),
+        ("Informações Adicionais", 'FridaSection'),
+    )
+    
+    # Rodapé: altura da linha de base (dentro da margem inferior de 2cm)
+    FOOTER_Y = 1*cm
+    
+    # Download da imagem do produto
+    IMAGE_FETCH_TIMEOUT = (3.05, 10)  # (connect, read) em segundos
+    IMAGE_ETAG_CACHE_MAX_BYTES = 32 * 1024 * 1024  # Soma dos corpos guardados com ETag (FIFO)
+    IMAGE_MAX_HEIGHT = 12*cm
+    
+    # Estilos e Paragraphs fixos: montados pela primeira instância e
+    # compartilhados por todas (só leitura; cada PDF usa cópias via _static)
+    _shared_styles = None
+    _shared_paragraphs = None
+    _shared_lock = threading.Lock()
+    
     def __init__(self):
-        """Inicializa estilos do PDF."""
-        self.styles = getSampleStyleSheet()
-        self._create_custom_styles()
+        """Inicializa estilos do PDF e a sessão HTTP das imagens."""
+        cls = type(self)
+        with cls._shared_lock:
+            if cls._shared_styles is None:
+                self.styles = getSampleStyleSheet()
+                self._create_custom_styles()
+                cls._shared_paragraphs = {
+                    text: Paragraph(text, self.styles[style])
+                    for text, style in self._STATIC_TEXTS
+                }
+                cls._shared_styles = self.styles
+        
+        self.styles = cls._shared_styles
+        self._static_paragraphs = cls._shared_paragraphs
+        
+        # Sessão keep-alive: as imagens vêm todas do mesmo host (Supabase
+        # Storage), então o TLS handshake é feito uma vez por conexão do pool
+        self._http = requests.Session()
+        self._http.mount(
+            "https://",
+            HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=16,
+                max_retries=Retry(
+                    total=2,
+                    backoff_factor=0.2,
+                    status_forcelist=[429, 500, 502, 503, 504],
+                    raise_on_status=False
+                )
+            )
+        )
+        
+        # URL → (ETag, bytes, (largura, altura) em px): revalida com
+        # If-None-Match e, quando o storage responde 304, reaproveita o corpo
+        # e as dimensões sem decodificar o header de novo. Os uploads usam
+        # upsert, então a URL sozinha não identifica a imagem; quem decide é
+        # o ETag. O limite é pela soma dos bytes, não pelo número de URLs.
+        self._etag_cache: Dict[str, Tuple[str, bytes, Optional[Tuple[int, int]]]] = {}
+        self._etag_cache_bytes = 0
+        self._etag_lock = threading.Lock()
     
     def _create_custom_styles(self):
         """Cria estilos customizados para o PDF."""
@@ -103,8 +303,9 @@ class TechnicalSheetPDFGenerator:
         self,
         sheet_data: Dict[str, Any],
         product_data: Dict[str, Any],
-        processed_image_url: Optional[str] = None
-    ) -> BytesIO:
+        processed_image_url: Optional[str] = None,
+        output_stream: Optional[BinaryIO] = None
+    ) -> BinaryIO:
         """
         Gera PDF da ficha técnica.
         
@@ -112,152 +313,150 @@ class TechnicalSheetPDFGenerator:
             sheet_data: Dados da ficha (dict com dimensions, materials, etc)
             product_data: Dados do produto (category, name, etc)
             processed_image_url: URL da imagem processada (opcional)
+            output_stream: Arquivo binário de destino (opcional). O PDF é
+                escrito direto nele, sem buffer intermediário em memória.
         
         Returns:
-            BytesIO com o conteúdo do PDF
+            output_stream, ou BytesIO (posicionado no início) com o PDF
         """
-        buffer = BytesIO()
+        buffer = output_stream if output_stream is not None else BytesIO()
         
         doc = SimpleDocTemplate(
             buffer,
             pagesize=A4,
-            rightMargin=2*cm,
-            leftMargin=2*cm,
-            topMargin=2*cm,
-            bottomMargin=2*cm
+            rightMargin=self.PAGE_MARGIN,
+            leftMargin=self.PAGE_MARGIN,
+            topMargin=self.PAGE_MARGIN,
+            bottomMargin=self.PAGE_MARGIN
         )
         
         elements = []
         
         # === HEADER ===
-        elements.append(Paragraph("FRIDA", self.styles['FridaTitle']))
-        elements.append(Paragraph("Ficha Técnica de Produto", self.styles['FridaSubtitle']))
+        elements.append(self._static("FRIDA"))
+        elements.append(self._static("Ficha Técnica de Produto"))
         
-        # === IDENTIFICAÇÃO ===
-        elements.append(Paragraph("Identificação", self.styles['FridaSection']))
+        # Campos lidos uma vez no início (usados em mais de um bloco)
+        product = product_data.get
+        version = sheet_data.get("_version", 1)
+        data = sheet_data.get("data") or sheet_data  # Suporta nested ou flat
         
+        # === IDENTIFICAÇÃO ===
         info_data = [
-            ["Categoria", product_data.get("category", "N/A")],
-            ["Nome", product_data.get("name", "N/A")],
-            ["SKU", product_data.get("sku", "N/A")],
+            ["Categoria", product("category", "N/A")],
+            ["Nome", product("name", "N/A")],
+            ["SKU", product("sku", "N/A")],
             ["Status", sheet_data.get("status", "draft").upper()],
-            ["Versão", str(sheet_data.get("_version", 1))],
+            ["Versão", str(version)],
         ]
         
         # Adicionar created_at se disponível
-        if product_data.get("created_at"):
-            info_data.append(["Criado em", self._format_date(str(product_data["created_at"]))])
-        
-        elements.append(self._create_info_table(info_data))
-        elements.append(Spacer(1, 0.5*cm))
+        created_at = product("created_at")
+        if created_at:
+            info_data.append(["Criado em", self._format_date(str(created_at))])
+        
+        elements.append(KeepTogether([
+            self._static("Identificação"),
+            self._create_info_table(info_data),
+            Spacer(1, self.BLOCK_SPACING)
+        ]))
         
         # === IMAGEM DO PRODUTO ===
         if processed_image_url:
             img = self._fetch_image(processed_image_url)
             if img:
-                elements.append(Paragraph("Imagem do Produto", self.styles['FridaSection']))
-                elements.append(img)
-                elements.append(Spacer(1, 0.5*cm))
-        
-        # === DIMENSÕES ===
-        data = sheet_data.get("data", sheet_data)  # Suporta nested ou flat
-        
-        if data.get("dimensions"):
-            elements.append(Paragraph("Dimensões", self.styles['FridaSection']))
-            dims = data["dimensions"]
-            dim_data = []
-            if dims.get("altura"):
-                dim_data.append(["Altura", f"{dims['altura']} cm"])
-            if dims.get("largura"):
-                dim_data.append(["Largura", f"{dims['largura']} cm"])
-            if dims.get("profundidade"):
-                dim_data.append(["Profundidade", f"{dims['profundidade']} cm"])
-            if dims.get("alca"):
-                dim_data.append(["Alça", f"{dims['alca']} cm"])
-            if dim_data:
-                elements.append(self._create_info_table(dim_data))
-        
-        # === MATERIAIS ===
-        if data.get("materials"):
-            elements.append(Paragraph("Materiais", self.styles['FridaSection']))
-            mats = data["materials"]
-            mat_data = []
-            if mats.get("principal"):
-                mat_data.append(["Material Principal", mats["principal"]])
-            if mats.get("forro"):
-                mat_data.append(["Forro", mats["forro"]])
-            if mats.get("ferragens"):
-                mat_data.append(["Ferragens", mats["ferragens"]])
-            if mats.get("ziper"):
-                mat_data.append(["Zíper", mats["ziper"]])
-            if mat_data:
-                elements.append(self._create_info_table(mat_data))
-        
-        # === CORES ===
-        if data.get("colors"):
-            elements.append(Paragraph("Cores Disponíveis", self.styles['FridaSection']))
-            colors_text = ", ".join(data["colors"])
-            elements.append(Paragraph(colors_text, self.styles['FridaBody']))
-            elements.append(Spacer(1, 0.3*cm))
-        
-        # === PESO ===
-        if data.get("weight_grams"):
-            elements.append(Paragraph("Peso", self.styles['FridaSection']))
-            weight_kg = data["weight_grams"] / 1000
-            elements.append(Paragraph(
-                f"{data['weight_grams']}g ({weight_kg:.2f} kg)",
-                self.styles['FridaBody']
-            ))
-            elements.append(Spacer(1, 0.3*cm))
-        
-        # === FORNECEDOR ===
-        if data.get("supplier"):
-            elements.append(Paragraph("Fornecedor", self.styles['FridaSection']))
-            sup = data["supplier"]
-            sup_data = []
-            if sup.get("nome"):
-                sup_data.append(["Nome", sup["nome"]])
-            if sup.get("contato"):
-                sup_data.append(["Contato", sup["contato"]])
-            if sup.get("cnpj"):
-                sup_data.append(["CNPJ", sup["cnpj"]])
-            if sup.get("prazo_entrega"):
-                sup_data.append(["Prazo de Entrega", sup["prazo_entrega"]])
-            if sup_data:
-                elements.append(self._create_info_table(sup_data))
-        
-        # === INSTRUÇÕES DE CUIDADO ===
-        if data.get("care_instructions"):
-            elements.append(Paragraph("Instruções de Cuidado", self.styles['FridaSection']))
-            elements.append(Paragraph(
-                data["care_instructions"],
-                self.styles['FridaBody']
-            ))
-            elements.append(Spacer(1, 0.3*cm))
-        
-        # === CAMPOS CUSTOMIZADOS ===
-        if data.get("custom_fields"):
-            elements.append(Paragraph("Informações Adicionais", self.styles['FridaSection']))
-            custom_data = [
-                [str(k), str(v)]
-                for k, v in data["custom_fields"].items()
-            ]
-            if custom_data:
-                elements.append(self._create_info_table(custom_data))
+                elements.append(KeepTogether([
+                    self._static("Imagem do Produto"),
+                    img,
+                    Spacer(1, self.BLOCK_SPACING)
+                ]))
+        
+        # === SEÇÕES DA FICHA ===
+        section_value = data.get
+        body_style = self.styles['FridaBody']
+        
+        for key, title, builder in SECTIONS:
+            value = section_value(key)
+            if not value:
+                continue
+            
+            content = builder(value)
+            if not content:
+                continue
+            
+            if isinstance(content, str):
+                # Seção de texto corrido
+                section = [
+                    self._static(title),
+                    Paragraph(content, body_style),
+                    Spacer(1, self.TEXT_SPACING)
+                ]
+            else:
+                # Seção em tabela (label + valor)
+                section = [self._static(title), self._create_info_table(content)]
+            
+            # Um flowable por seção: título nunca fica órfão no fim da página
+            elements.append(KeepTogether(section))
         
         # === FOOTER ===
-        elements.append(Spacer(1, 1*cm))
+        # Desenhado no canvas de cada página (onPage), fora do fluxo de
+        # flowables: não participa da paginação e não força novo build
         generation_date = datetime.now().strftime("%d/%m/%Y às %H:%M")
-        version = sheet_data.get("_version", 1)
         footer_text = f"Documento gerado em {generation_date} | Versão {version} | FRIDA v0.5.1"
-        elements.append(Paragraph(footer_text, self.styles['FridaFooter']))
+        draw_footer = partial(self._draw_footer, footer_text=footer_text)
         
-        # Gerar PDF
-        doc.build(elements)
-        buffer.seek(0)
+        # Gerar PDF (build simples: uma passada, sem TOC/multiBuild)
+        doc.build(elements, onFirstPage=draw_footer, onLaterPages=draw_footer)
+        if output_stream is None:
+            buffer.seek(0)
         
         return buffer
     
+    def generate_bytes(
+        self,
+        sheet_data: Dict[str, Any],
+        product_data: Dict[str, Any],
+        processed_image_url: Optional[str] = None
+    ) -> bytes:
+        """
+        Gera PDF da ficha técnica e retorna os bytes.
+        
+        Para respostas que enviam o PDF inteiro (Response(content=...)):
+        evita o getvalue() extra do chamador e o seek(0) do buffer.
+        
+        Returns:
+            Conteúdo do PDF (bytes)
+        """
+        buffer = BytesIO()
+        self.generate(sheet_data, product_data, processed_image_url, output_stream=buffer)
+        return buffer.getvalue()
+    
+    def _static(self, text: str) -> Paragraph:
+        """
+        Retorna o Paragraph pré-montado de um texto fixo.
+        
+        Cópia rasa: o parse do markup é compartilhado, mas wrap()/split()
+        do build gravam estado no flowable, então cada documento recebe
+        sua própria instância.
+        """
+        return copy.copy(self._static_paragraphs[text])
+    
+    def _draw_footer(self, canvas, doc, footer_text: str) -> None:
+        """
+        Desenha o rodapé centralizado na margem inferior da página.
+        
+        Args:
+            canvas: Canvas do ReportLab da página atual
+            doc: Documento em construção
+            footer_text: Texto do rodapé
+        """
+        style = self.styles['FridaFooter']
+        canvas.saveState()
+        canvas.setFont(style.fontName, style.fontSize)
+        canvas.setFillColor(style.textColor)
+        canvas.drawCentredString(doc.pagesize[0] / 2, self.FOOTER_Y, footer_text)
+        canvas.restoreState()
+    
     def _create_info_table(self, data: List[List[str]]) -> Table:
         """
         Cria tabela de informações (2 colunas: label + valor).
@@ -268,27 +467,8 @@ class TechnicalSheetPDFGenerator:
         Returns:
             Table formatada
         """
-        table = Table(data, colWidths=[4*cm, 10*cm])
-        
-        table.setStyle(TableStyle([
-            # Header styling
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('TEXTCOLOR', (0, 0), (0, -1), self.FRIDA_BLACK),
-            ('TEXTCOLOR', (1, 0), (1, -1), self.FRIDA_BODY),
-            # Padding
-            ('TOPPADDING', (0, 0), (-1, -1), 4),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ('LEFTPADDING', (0, 0), (-1, -1), 6),
-            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-            # Borders
-            ('LINEBELOW', (0, 0), (-1, -1), 0.5, self.FRIDA_BORDER),
-            # Background alternado
-            ('ROWBACKGROUNDS', (0, 0), (-1, -1), [colors.white, self.FRIDA_LIGHT]),
-            # Alinhamento
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        table = Table(data, colWidths=self._INFO_COL_WIDTHS)
+        table.setStyle(self._INFO_TABLE_STYLE)
         
         return table
     
@@ -296,6 +476,9 @@ class TechnicalSheetPDFGenerator:
         """
         Busca imagem de URL e formata para o PDF.
         
+        Cada chamada revalida a URL com o ETag; em 304 os bytes e as
+        dimensões guardados são reaproveitados.
+        
         Args:
             url: URL da imagem
             max_width: Largura máxima em cm
@@ -304,31 +487,76 @@ class TechnicalSheetPDFGenerator:
             Imagem formatada ou None se falhar
         """
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            
-            img_buffer = BytesIO(response.content)
+            content, size = self._download_image(url)
             
-            # Criar imagem e calcular proporções
-            img = RLImage(img_buffer)
+            if size is None:
+                img = RLImage(BytesIO(content))
+                size = (img.imageWidth, img.imageHeight)
+                self._store_image_size(url, content, size)
+            else:
+                img = RLImage(BytesIO(content), width=size[0], height=size[1])
             
             # Manter aspect ratio
-            aspect = img.imageHeight / img.imageWidth
+            aspect = size[1] / size[0]
             img.drawWidth = max_width
             img.drawHeight = max_width * aspect
             
             # Limitar altura máxima
-            max_height = 12*cm
-            if img.drawHeight > max_height:
-                img.drawHeight = max_height
-                img.drawWidth = max_height / aspect
+            if img.drawHeight > self.IMAGE_MAX_HEIGHT:
+                img.drawHeight = self.IMAGE_MAX_HEIGHT
+                img.drawWidth = self.IMAGE_MAX_HEIGHT / aspect
             
             return img
             
         except Exception as e:
-            print(f"[PDF] ⚠ Erro ao buscar imagem: {str(e)}")
+            logger.warning("[PDF] ⚠ Erro ao buscar imagem: %s", e)
             return None
     
+    def _download_image(self, url: str) -> Tuple[bytes, Optional[Tuple[int, int]]]:
+        """
+        Baixa a imagem pela sessão do gerador, com GET condicional.
+        
+        Args:
+            url: URL da imagem
+        
+        Returns:
+            Tupla (bytes, dimensões em px ou None). Em 304 ambos vêm do
+            cache; em download novo as dimensões ainda não são conhecidas.
+        """
+        with self._etag_lock:
+            cached = self._etag_cache.get(url)
+        
+        headers = {"If-None-Match": cached[0]} if cached else None
+        
+        with closing(self._http.get(url, headers=headers, timeout=self.IMAGE_FETCH_TIMEOUT)) as response:
+            if cached and response.status_code == 304:
+                return cached[1], cached[2]
+            
+            response.raise_for_status()
+            content = response.content
+            etag = response.headers.get("ETag")
+        
+        with self._etag_lock:
+            old = self._etag_cache.pop(url, None)
+            if old:
+                self._etag_cache_bytes -= len(old[1])
+            if etag and len(content) <= self.IMAGE_ETAG_CACHE_MAX_BYTES:
+                while self._etag_cache_bytes + len(content) > self.IMAGE_ETAG_CACHE_MAX_BYTES:
+                    # dict preserva ordem de inserção: remove a entrada mais antiga
+                    oldest = self._etag_cache.pop(next(iter(self._etag_cache)))
+                    self._etag_cache_bytes -= len(oldest[1])
+                self._etag_cache[url] = (etag, content, None)
+                self._etag_cache_bytes += len(content)
+        
+        return content, None
+    
+    def _store_image_size(self, url: str, content: bytes, size: Tuple[int, int]) -> None:
+        """Guarda as dimensões junto à entrada do ETag que trouxe estes bytes."""
+        with self._etag_lock:
+            entry = self._etag_cache.get(url)
+            if entry and entry[1] is content:
+                self._etag_cache[url] = (entry[0], content, size)
+    
     def _format_date(self, date_str: str) -> str:
         """
         Formata data ISO para DD/MM/YYYY.
@@ -340,13 +568,10 @@ class TechnicalSheetPDFGenerator:
             Data formatada ou "N/A"
         """
         try:
-            # Tenta vários formatos comuns
-            for fmt in ["%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d"]:
-                try:
-                    dt = datetime.strptime(date_str[:19], fmt)
-                    return dt.strftime("%d/%m/%Y")
-                except ValueError:
-                    continue
+            # fromisoformat aceita "T" ou espaço como separador e data pura
+            dt = datetime.fromisoformat(date_str[:19])
+            return f"{dt.day:02d}/{dt.month:02d}/{dt.year}"
+        except ValueError:
             return date_str[:10] if len(date_str) >= 10 else "N/A"
         except:
             return "N/A"
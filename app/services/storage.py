@@ -10,13 +10,17 @@ Estrutura de arquivos no Storage:
 - {user_id}/{timestamp}_{unique_id}.png (se não)
 """
 
-import uuid
-from datetime import datetime
+import os
+import time
 from typing import Optional, TypedDict
 
 from supabase import create_client, Client
 
 from app.config import settings
+from app.logging_config import get_logger
+
+
+logger = get_logger(__name__)
 
 
 class StorageResult(TypedDict):
@@ -55,7 +59,7 @@ class StorageService:
             settings.SUPABASE_KEY
         )
         
-        print("[StorageService] Cliente Supabase inicializado")
+        logger.info("[StorageService] Cliente Supabase inicializado")
     
     def upload_image(
         self, 
@@ -80,8 +84,9 @@ class StorageService:
         """
         try:
             # Gera nome único para o arquivo
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            unique_id = uuid.uuid4().hex[:8]
+            # YYYYmmdd_HHMMSS_8hex: 32 bits aleatórios bastam dentro do mesmo segundo
+            timestamp = time.strftime("%Y%m%d_%H%M%S")
+            unique_id = os.urandom(4).hex()
             filename = f"{timestamp}_{unique_id}.{extension}"
             
             # Constrói path com namespace por user_id
@@ -100,11 +105,11 @@ class StorageService:
             # Obtém URL pública
             public_url = self.client.storage.from_(self.BUCKET_NAME).get_public_url(path)
             
-            print(f"[StorageService] ✅ Image uploaded for user {user_id}: {path}")
+            logger.info("[StorageService] ✅ Image uploaded for user %s: %s", user_id, path)
             return True, public_url
             
         except Exception as e:
-            print(f"[StorageService] Erro no upload: {e}")
+            logger.error("[StorageService] Erro no upload: %s", e)
             return False, None
     
     def registrar_geracao(
@@ -153,13 +158,13 @@ class StorageService:
             
             if response.data and len(response.data) > 0:
                 record_id = response.data[0].get("id")
-                print(f"[StorageService] ✅ Registro criado para user {user_id}: {record_id}")
+                logger.info("[StorageService] ✅ Registro criado para user %s: %s", user_id, record_id)
                 return True, record_id
             
             return False, None
             
         except Exception as e:
-            print(f"[StorageService] Erro ao registrar: {e}")
+            logger.error("[StorageService] Erro ao registrar: %s", e)
             return False, None
     
     def processar_e_registrar(
@@ -1,18 +1,24 @@
 """
 Frida Orchestrator - Tech Sheet Service
 Geração de fichas técnicas premium usando Gemini e Jinja2.
+
+A extração usa Structured Output do Gemini (response_mime_type +
+response_schema), como o ClassifierService: a resposta já é JSON válido.
 """
 
 import io
+import json
 import base64
+from concurrent.futures import ThreadPoolExecutor, Future
 from pathlib import Path
 from PIL import Image
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, Template
+from markupsafe import Markup
 import google.generativeai as genai
 from typing import TypedDict, Optional
 
-from app.config import settings
-from app.utils import safe_json_parse, image_to_bytes
+from app.config import settings, ProductStyle
+from app.utils import image_to_bytes, encode_image
 
 
 class TechSheetData(TypedDict):
@@ -26,6 +32,30 @@ class TechSheetData(TypedDict):
     detalhes: list[str]
 
 
+# Schema para Gemini Structured Output (mesmo formato do TechSheetData)
+TECH_SHEET_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "nome": {"type": "string"},
+        "categoria": {"type": "string"},
+        "descricao": {"type": "string"},
+        "materiais": {"type": "array", "items": {"type": "string"}},
+        "cores": {"type": "array", "items": {"type": "string"}},
+        "dimensoes": {
+            "type": "object",
+            "properties": {
+                "altura": {"type": "string"},
+                "largura": {"type": "string"},
+                "profundidade": {"type": "string"}
+            },
+            "required": ["altura", "largura", "profundidade"]
+        },
+        "detalhes": {"type": "array", "items": {"type": "string"}}
+    },
+    "required": ["nome", "categoria", "descricao", "materiais", "cores", "dimensoes", "detalhes"]
+}
+
+
 class TechSheetService:
     """
     Serviço de geração de fichas técnicas premium.
@@ -54,20 +84,50 @@ Seja criativo mas realista. Use terminologia de moda de luxo.
 IMPORTANTE: Responda APENAS com o JSON, sem texto adicional.
 """
     
+    # Fotos sem transparência vão como JPEG (encode ~10x mais barato que PNG
+    # e base64 bem menor no HTML); sketches e recortes seguem em PNG
+    PHOTO_JPEG_QUALITY = 85
+    
+    TEMPLATE_NAME = "tech_sheet_premium.html"
+    
+    # Formatos aceitos inline pelo Gemini e por <img> data URL: bytes do
+    # upload nesses formatos dispensam decode + re-encode
+    INLINE_MIME_TYPES = frozenset(["image/jpeg", "image/png", "image/webp"])
+    
+    POOL_WORKERS = 4
+    
     def __init__(self):
         """Inicializa o serviço."""
         if not settings.GEMINI_API_KEY:
             raise ValueError("GEMINI_API_KEY não configurada")
         
         genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(settings.GEMINI_MODEL_TECH_SHEET)
         
-        # Configura Jinja2
+        # Configura o modelo com Structured Output
+        self.generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=TECH_SHEET_SCHEMA
+        )
+        
+        self.model = genai.GenerativeModel(
+            model_name=settings.GEMINI_MODEL_TECH_SHEET,
+            generation_config=self.generation_config
+        )
+        
+        # Prompt formatado por categoria (poucas categorias, texto fixo)
+        self._prompt_cache: dict[str, str] = {}
+        
+        # Fichas disparadas em paralelo ao pipeline (iniciar_ficha_upload)
+        self._pool = ThreadPoolExecutor(max_workers=self.POOL_WORKERS, thread_name_prefix="tech-sheet")
+        
+        # Configura Jinja2 (template estático: sem stat/recompile por request)
         templates_dir = Path(__file__).parent.parent / "templates"
         self.jinja_env = Environment(
             loader=FileSystemLoader(templates_dir),
-            autoescape=True
+            autoescape=True,
+            auto_reload=False
         )
+        self._template: Optional[Template] = None
     
     def extrair_dados(
         self, 
@@ -87,21 +147,10 @@ IMPORTANTE: Responda APENAS com o JSON, sem texto adicional.
             TechSheetData com informações extraídas
         """
         try:
-            prompt = self.PROMPT_TEMPLATE.format(categoria=categoria)
-            
-            image_part = {
-                "mime_type": mime_type,
-                "data": image_bytes
-            }
-            
-            response = self.model.generate_content([prompt, image_part])
-            result = safe_json_parse(response.text)
-            
-            if result is None:
-                return self._default_data(categoria)
-            
-            return self._normalize_data(result, categoria)
-            
+            response = self.model.generate_content(
+                self._build_contents(image_bytes, categoria, mime_type)
+            )
+            return self._parse_response(response.text, categoria)
         except Exception as e:
             print(f"[TechSheetService] Erro ao extrair dados: {e}")
             return self._default_data(categoria)
@@ -109,7 +158,8 @@ IMPORTANTE: Responda APENAS com o JSON, sem texto adicional.
     def renderizar_html(
         self, 
         dados: TechSheetData, 
-        image_base64: Optional[str] = None
+        image_base64: Optional[str] = None,
+        image_mime: str = "image/png"
     ) -> str:
         """
         Renderiza a ficha técnica em HTML usando template Jinja2.
@@ -117,15 +167,19 @@ IMPORTANTE: Responda APENAS com o JSON, sem texto adicional.
         Args:
             dados: Dados da ficha técnica
             image_base64: Imagem em base64 para incluir no HTML
+            image_mime: Tipo MIME da imagem em base64
             
         Returns:
             HTML renderizado
         """
         try:
-            template = self.jinja_env.get_template("tech_sheet_premium.html")
-            return template.render(
+            if self._template is None:
+                # Compilado uma vez; renders seguintes reutilizam o bytecode
+                self._template = self.jinja_env.get_template(self.TEMPLATE_NAME)
+            return self._template.render(
                 dados=dados,
-                image_base64=image_base64
+                image_base64=image_base64,
+                image_mime=image_mime
             )
         except Exception as e:
             print(f"[TechSheetService] Erro ao renderizar HTML: {e}")
@@ -133,36 +187,145 @@ IMPORTANTE: Responda APENAS com o JSON, sem texto adicional.
     
     def gerar_ficha_completa(
         self,
-        image: Image.Image,
+        image_bytes: bytes,
+        mime_type: str,
         categoria: str
     ) -> dict:
         """
         Gera a ficha técnica completa: extrai dados e renderiza HTML.
         
+        Os bytes vão sem re-encode para o Gemini e para o HTML. Use
+        INLINE_MIME_TYPES para decidir se o upload pode ser passado direto;
+        para imagens PIL (ou outros formatos), use gerar_ficha_from_pil().
+        
         Args:
-            image: Imagem PIL do produto
+            image_bytes: Imagem do produto já encodada
+            mime_type: Tipo MIME de image_bytes (ex: image/jpeg)
             categoria: Categoria do produto
             
         Returns:
             Dict com dados e HTML da ficha
         """
-        # Converte imagem para bytes
-        image_bytes = image_to_bytes(image, format="PNG")
-        
-        # Converte para base64 para embedding no HTML
-        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+        # Converte para base64 para embedding no HTML. O alfabeto base64 não
+        # tem caracteres especiais de HTML: Markup evita que o autoescape do
+        # Jinja varra e copie os vários MB da string no render.
+        image_base64 = Markup(base64.b64encode(image_bytes).decode("ascii"))
         
         # Extrai dados usando Gemini
-        dados = self.extrair_dados(image_bytes, categoria)
+        dados = self.extrair_dados(image_bytes, categoria, mime_type=mime_type)
         
         # Renderiza HTML
-        html = self.renderizar_html(dados, image_base64)
+        html = self.renderizar_html(dados, image_base64, image_mime=mime_type)
         
         return {
             "dados": dados,
             "html": html
         }
     
+    def gerar_ficha_upload(
+        self,
+        image_bytes: bytes,
+        content_type: Optional[str],
+        categoria: str,
+        estilo: Optional[str] = None
+    ) -> dict:
+        """
+        Gera a ficha a partir dos bytes de um upload.
+        
+        Formatos em INLINE_MIME_TYPES vão direto; os demais (ex: GIF) são
+        decodificados e re-encodados via gerar_ficha_from_pil().
+        """
+        if content_type in self.INLINE_MIME_TYPES:
+            return self.gerar_ficha_completa(image_bytes, content_type, categoria)
+        
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return self.gerar_ficha_from_pil(image, categoria, estilo=estilo)
+    
+    def iniciar_ficha_upload(
+        self,
+        image_bytes: bytes,
+        content_type: Optional[str],
+        categoria: str,
+        estilo: Optional[str] = None
+    ) -> Future:
+        """
+        Dispara gerar_ficha_upload() no pool do serviço.
+        
+        Para rotas síncronas: a chamada ao Gemini (segundos) corre enquanto
+        a rota segue com pipeline/upload; o resultado sai de future.result().
+        
+        Returns:
+            Future com o dict da ficha
+        """
+        return self._pool.submit(
+            self.gerar_ficha_upload, image_bytes, content_type, categoria, estilo
+        )
+    
+    def gerar_ficha_from_pil(
+        self,
+        image: Image.Image,
+        categoria: str,
+        estilo: Optional[str] = None
+    ) -> dict:
+        """
+        Conveniência para quem só tem a imagem PIL: encoda e gera a ficha.
+        
+        Args:
+            image: Imagem PIL do produto
+            categoria: Categoria do produto
+            estilo: Estilo da imagem (foto/sketch); fotos sem alpha vão em JPEG
+            
+        Returns:
+            Dict com dados e HTML da ficha
+        """
+        image_bytes, mime_type = self._encode_image(image, estilo)
+        return self.gerar_ficha_completa(image_bytes, mime_type, categoria)
+    
+    def _build_contents(self, image_bytes: bytes, categoria: str, mime_type: str) -> list:
+        """Monta o conteúdo da requisição ao Gemini (prompt + imagem)."""
+        image_part = {
+            "mime_type": mime_type,
+            "data": image_bytes
+        }
+        return [self._get_prompt(categoria), image_part]
+    
+    def _parse_response(self, text: str, categoria: str) -> TechSheetData:
+        """Converte a resposta JSON do Gemini em TechSheetData."""
+        try:
+            # Parse direto do JSON (garantido pelo Structured Output)
+            result = json.loads(text)
+        except json.JSONDecodeError as e:
+            # Não deveria acontecer com Structured Output, mas safety first
+            print(f"[TechSheetService] Erro de JSON (inesperado com Structured Output): {e}")
+            return self._default_data(categoria)
+        
+        if not isinstance(result, dict):
+            return self._default_data(categoria)
+        
+        return self._normalize_data(result, categoria)
+    
+    def _get_prompt(self, categoria: str) -> str:
+        """Prompt da categoria (formatado uma vez e reutilizado)."""
+        prompt = self._prompt_cache.get(categoria)
+        if prompt is None:
+            prompt = self._prompt_cache[categoria] = self.PROMPT_TEMPLATE.format(categoria=categoria)
+        return prompt
+    
+    def _encode_image(self, image: Image.Image, estilo: Optional[str]) -> tuple[bytes, str]:
+        """
+        Encoda a imagem para Gemini + HTML.
+        
+        Returns:
+            Tuple (bytes, mime_type)
+        """
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        
+        if estilo == ProductStyle.FOTO.value and not has_alpha:
+            photo = image if image.mode in ("RGB", "L") else image.convert("RGB")
+            return encode_image(photo, format="JPEG", quality=self.PHOTO_JPEG_QUALITY), "image/jpeg"
+        
+        return image_to_bytes(image, format="PNG"), "image/png"
+    
     def _normalize_data(self, result: dict, categoria: str) -> TechSheetData:
         """Normaliza os dados extraídos."""
         return TechSheetData(
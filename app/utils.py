@@ -5,16 +5,82 @@ Funções auxiliares para manipulação de imagens e validações.
 
 import io
 import json
+import secrets
+import time
 from PIL import Image
-from typing import Optional
+from typing import BinaryIO, Optional
 
+from app.logging_config import get_logger
 
-def image_to_bytes(image: Image.Image, format: str = "PNG") -> bytes:
-    """Converte uma imagem PIL para bytes."""
-    buffer = io.BytesIO()
-    image.save(buffer, format=format)
-    buffer.seek(0)
-    return buffer.getvalue()
+logger = get_logger(__name__)
+
+
+# Nível zlib dos PNGs intermediários: o padrão (6) custa várias vezes mais
+# CPU para arquivos só ~15% menores
+PNG_COMPRESS_LEVEL = 1
+
+
+def encode_image(image: Image.Image, format: str = "PNG", **params) -> bytes:
+    """Encoda uma imagem PIL em memória no formato e parâmetros dados."""
+    with io.BytesIO() as buffer:
+        image.save(buffer, format=format, **params)
+        return buffer.getvalue()
+
+
+def image_to_bytes(
+    image: Image.Image,
+    format: str = "PNG",
+    out: Optional[BinaryIO] = None
+) -> Optional[bytes]:
+    """
+    Converte uma imagem PIL para bytes.
+
+    Com out (arquivo, resposta, BytesIO do chamador), encoda direto no
+    stream e retorna None, sem a cópia intermediária em bytes.
+
+    PNG sai com compress_level=PNG_COMPRESS_LEVEL (deflate rápido), como
+    no ImageComposer e no job worker.
+    """
+    params = {"compress_level": PNG_COMPRESS_LEVEL} if format.upper() == "PNG" else {}
+    if out is not None:
+        image.save(out, format=format, **params)
+        return None
+    return encode_image(image, format=format, **params)
+
+
+def image_to_raw_bytes(image: Image.Image) -> bytes:
+    """
+    Serializa os pixels crus da imagem (sem container) em uma única alocação.
+
+    Equivale a image.tobytes(), mas chama o encoder "raw" uma vez com o
+    tamanho final em vez de juntar pedaços de 64KB (evita o pico de ~2x de
+    memória). Para repasses internos; volte com Image.frombuffer/frombytes
+    usando o mesmo mode e size.
+
+    Usa a API privada do Pillow (Image._getencoder, image.im), conferida
+    com pillow==10.4.0 do requirements.txt; se ela mudar, cai em tobytes().
+
+    Args:
+        image: Imagem PIL
+
+    Returns:
+        Pixels no layout do mode da imagem (bytes)
+    """
+    image.load()
+    if image.width == 0 or image.height == 0:
+        return b""
+
+    try:
+        encoder = Image._getencoder(image.mode, "raw", image.mode)
+        encoder.setimage(image.im, (0, 0) + image.size)
+        _, errcode, data = encoder.encode(image.width * image.height * len(image.getbands()))
+    except (AttributeError, TypeError, ValueError):
+        return image.tobytes()
+
+    # errcode 1 = tudo escrito; qualquer outro caso cai no caminho padrão
+    if errcode != 1:
+        return image.tobytes()
+    return data
 
 
 def bytes_to_image(image_bytes: bytes) -> Image.Image:
@@ -22,16 +88,31 @@ def bytes_to_image(image_bytes: bytes) -> Image.Image:
     return Image.open(io.BytesIO(image_bytes))
 
 
-def resize_image(image: Image.Image, size: tuple[int, int] = (1080, 1080)) -> Image.Image:
+def resize_image(
+    image: Image.Image,
+    size: tuple[int, int] = (1080, 1080),
+    resample: Image.Resampling = Image.Resampling.LANCZOS
+) -> Image.Image:
     """
     Redimensiona a imagem para o tamanho padrão de e-commerce.
     Mantém aspect ratio e centraliza em fundo branco.
+    
+    Em JPEG recém-aberto (pixels ainda não decodificados), o draft() faz o
+    libjpeg reduzir por 1/2, 1/4 ou 1/8 já no decode (nunca abaixo de size).
+    BICUBIC é uma alternativa mais rápida ao LANCZOS com perda mínima.
     """
-    # Cria uma nova imagem com fundo branco
-    new_image = Image.new("RGBA", size, (255, 255, 255, 255))
+    if image.format == "JPEG":
+        image.draft(None, size)
     
     # Calcula o tamanho proporcional
-    image.thumbnail(size, Image.Resampling.LANCZOS)
+    image.thumbnail(size, resample)
+    
+    # Imagem opaca que já preenche o frame: o canvas seria todo coberto
+    if image.size == size and image.mode != "RGBA":
+        return image.convert("RGBA")
+    
+    # Cria uma nova imagem com fundo branco
+    new_image = Image.new("RGBA", size, (255, 255, 255, 255))
     
     # Centraliza a imagem
     x = (size[0] - image.width) // 2
@@ -132,6 +213,27 @@ IMAGE_MAGIC_NUMBERS = {
     "webp": [b'RIFF'],  # WebP começa com RIFF (precisa verificar WEBP depois)
 }
 
+
+def _build_magic_index() -> dict[bytes, tuple[tuple[str, bytes], ...]]:
+    """
+    Indexa IMAGE_MAGIC_NUMBERS pelos 4 primeiros bytes de cada assinatura.
+
+    Todas as assinaturas têm ao menos 4 bytes e o prefixo já separa os
+    formatos entre si (GIF87a/GIF89a compartilham "GIF8").
+    """
+    index: dict[bytes, tuple[tuple[str, bytes], ...]] = {}
+    for format_name, signatures in IMAGE_MAGIC_NUMBERS.items():
+        for sig in signatures:
+            index[sig[:4]] = index.get(sig[:4], ()) + ((format_name, sig),)
+    return index
+
+
+# Bytes do início do arquivo cobertos pelas assinaturas (+ "WEBP" em 8:12)
+MAGIC_HEADER_SIZE = 16
+
+# Prefixo de 4 bytes → ((formato, assinatura completa), ...)
+_MAGIC_BY_PREFIX = _build_magic_index()
+
 ALLOWED_CONTENT_TYPES = frozenset([
     "image/jpeg",
     "image/png", 
@@ -141,6 +243,14 @@ ALLOWED_CONTENT_TYPES = frozenset([
 
 ALLOWED_PIL_FORMATS = frozenset(["JPEG", "PNG", "GIF", "WEBP"])
 
+# Formato PIL esperado para cada Content-Type aceito
+CONTENT_TYPE_TO_PIL_FORMAT = {
+    "image/jpeg": "JPEG",
+    "image/png": "PNG",
+    "image/gif": "GIF",
+    "image/webp": "WEBP"
+}
+
 
 def validate_content_type(content_type: str) -> bool:
     """
@@ -173,12 +283,13 @@ def validate_image_file(content_type: str) -> bool:
     return validate_content_type(content_type)
 
 
-def _check_magic_numbers(file_bytes: bytes) -> str | None:
+def _check_magic_numbers(file_bytes: bytes | memoryview) -> str | None:
     """
     Verifica os magic numbers (assinatura) do arquivo.
     
     Args:
-        file_bytes: Primeiros bytes do arquivo (mínimo 12 bytes recomendado)
+        file_bytes: Bytes (ou memoryview) do arquivo; só os primeiros
+            MAGIC_HEADER_SIZE bytes são lidos
         
     Returns:
         Tipo da imagem detectado ('jpeg', 'png', 'gif', 'webp') ou None
@@ -186,22 +297,44 @@ def _check_magic_numbers(file_bytes: bytes) -> str | None:
     if len(file_bytes) < 8:
         return None
     
-    # Verifica cada formato
-    for format_name, signatures in IMAGE_MAGIC_NUMBERS.items():
-        for sig in signatures:
-            if file_bytes.startswith(sig):
-                # Verificação adicional para WebP
-                if format_name == "webp":
-                    # WebP: RIFF....WEBP
-                    if len(file_bytes) >= 12 and file_bytes[8:12] == b'WEBP':
-                        return "webp"
-                else:
-                    return format_name
+    # Copia só o header (memoryview não tem startswith)
+    head = bytes(file_bytes[:MAGIC_HEADER_SIZE])
+    
+    # Um lookup pelos 4 primeiros bytes; só as assinaturas desse prefixo
+    # (em geral uma) são comparadas por inteiro
+    for format_name, sig in _MAGIC_BY_PREFIX.get(head[:4], ()):
+        if head.startswith(sig):
+            # Verificação adicional para WebP
+            if format_name == "webp":
+                # WebP: RIFF....WEBP
+                if head[8:12] == b'WEBP':
+                    return "webp"
+            else:
+                return format_name
     
     return None
 
 
-def validate_image_deep(file_bytes: bytes, content_type: Optional[str] = None) -> tuple[bool, str]:
+def _verify_structure(image: Image.Image) -> None:
+    """
+    Valida a integridade estrutural da imagem recém-aberta.
+
+    O verify() do Pillow não percorre os dados de um JPEG; nele o stream
+    entrópico é decodificado de fato, mas em escala 1/8 (draft), o que
+    detecta truncamento/corrupção com ~1/64 dos pixels.
+    """
+    if image.format == "JPEG":
+        image.draft(None, (1, 1))
+        image.load()
+    else:
+        image.verify()
+
+
+def validate_image_deep(
+    file_bytes: bytes,
+    content_type: Optional[str] = None,
+    quick: bool = True
+) -> tuple[bool, str]:
     """
     Validação PROFUNDA: Verifica magic numbers e integridade via Pillow.
     
@@ -210,12 +343,19 @@ def validate_image_deep(file_bytes: bytes, content_type: Optional[str] = None) -
     
     Pipeline de validação:
     1. Verifica magic numbers (assinatura dos primeiros bytes)
-    2. Tenta abrir com Pillow para validar integridade estrutural
+    2. Abre com Pillow (só o header); com quick=False também valida a
+       integridade estrutural do arquivo inteiro
     3. Confirma que o formato PIL está na lista permitida
     
+    No modo rápido a integridade dos dados fica a cargo do decode real,
+    feito logo depois pelo pipeline (que já trata imagens corrompidas).
+    
     Args:
         file_bytes: Bytes completos do arquivo a validar
         content_type: Opcional. Se fornecido, valida consistência.
+        quick: Se True (padrão), pula a verificação estrutural - que
+            percorre o arquivo todo (CRCs do PNG, stream do JPEG) - e
+            valida só o header
         
     Returns:
         Tuple (is_valid: bool, message: str)
@@ -239,21 +379,16 @@ def validate_image_deep(file_bytes: bytes, content_type: Optional[str] = None) -
     
     # 2. Tenta abrir com Pillow para validar integridade
     try:
-        # Primeira abertura para verify()
-        with io.BytesIO(file_bytes) as buffer1:
-            image1 = Image.open(buffer1)
+        # Uma única abertura: o formato vem do header (lido no open, antes do
+        # verify(), que invalida o objeto)
+        with io.BytesIO(file_bytes) as buffer:
+            image = Image.open(buffer)
             try:
-                image1.verify()
+                pil_format = image.format
+                if not quick:
+                    _verify_structure(image)
             finally:
-                image1.close()
-        
-        # Segunda abertura para obter formato (verify() invalida o objeto)
-        with io.BytesIO(file_bytes) as buffer2:
-            image2 = Image.open(buffer2)
-            try:
-                pil_format = image2.format
-            finally:
-                image2.close()
+                image.close()
         
     except Exception as e:
         return False, f"Arquivo corrompido ou não é uma imagem válida: {str(e)}"
@@ -264,16 +399,13 @@ def validate_image_deep(file_bytes: bytes, content_type: Optional[str] = None) -
     
     # 4. Validação opcional de consistência com Content-Type
     if content_type:
-        expected_formats = {
-            "image/jpeg": "JPEG",
-            "image/png": "PNG",
-            "image/gif": "GIF",
-            "image/webp": "WEBP"
-        }
-        expected = expected_formats.get(content_type)
+        expected = CONTENT_TYPE_TO_PIL_FORMAT.get(content_type)
         if expected and pil_format != expected:
             # Apenas log, não bloqueia (Content-Type pode ser errado do browser)
-            print(f"[WARN] Content-Type '{content_type}' não corresponde ao formato real '{pil_format}'")
+            logger.warning(
+                "[WARN] Content-Type '%s' não corresponde ao formato real '%s'",
+                content_type, pil_format
+            )
     
     # 5. Tudo OK!
     return True, f"Imagem {pil_format} válida"
@@ -281,10 +413,4 @@ def validate_image_deep(file_bytes: bytes, content_type: Optional[str] = None) -
 
 def generate_filename(categoria: str, extension: str = "png") -> str:
     """Gera um nome de arquivo único para a imagem processada."""
-    import uuid
-    from datetime import datetime
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = uuid.uuid4().hex[:8]
-    
-    return f"{categoria}_{timestamp}_{unique_id}.{extension}"
+    return f"{categoria}_{time.strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}.{extension}"
@@ -6,6 +6,7 @@ Testa o pipeline de processamento de imagem localmente sem Supabase.
 
 Uso:
     python scripts/test_pipeline.py path/to/test_image.jpg
+    python scripts/test_pipeline.py img1.jpg img2.jpg ...   # lote em paralelo
     
 Funcionalidades:
 1. Carrega imagem do disco
@@ -23,6 +24,7 @@ Exit Codes:
 
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Adicionar diretório pai ao path para imports
@@ -30,8 +32,8 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from PIL import Image
 from io import BytesIO
-from rembg import remove
 
+from app.config import settings
 from app.services.image_composer import image_composer
 from app.services.husk_layer import husk_layer, QualityReport
 
@@ -54,6 +56,14 @@ def test_composer(image_path: str) -> bytes:
     print("TESTE: ImageComposer")
     print("=" * 60)
     
+    # Recusa arquivos acima do limite da API antes de ler para a memória
+    file_size = os.path.getsize(image_path)
+    if file_size > settings.MAX_FILE_SIZE_BYTES:
+        raise ValueError(
+            f"Arquivo muito grande: {file_size:,} bytes "
+            f"(máximo {settings.MAX_FILE_SIZE_MB}MB)"
+        )
+    
     # Carregar imagem
     with open(image_path, 'rb') as f:
         image_bytes = f.read()
@@ -61,9 +71,12 @@ def test_composer(image_path: str) -> bytes:
     print(f"✓ Imagem carregada: {os.path.basename(image_path)}")
     print(f"  → Tamanho: {len(image_bytes):,} bytes")
     
-    # Remover fundo com rembg
+    # Remover fundo com rembg (sessão ONNX compartilhada com o pipeline).
+    # Import tardio: rembg/onnxruntime só carregam quando há segmentação.
+    from app.services.image_pipeline import remove_background
+    
     print("→ Removendo fundo (rembg)...")
-    segmented_bytes = remove(image_bytes)
+    segmented_bytes = remove_background(image_bytes)
     print(f"✓ Fundo removido: {len(segmented_bytes):,} bytes")
     
     # Salvar imagem segmentada
@@ -193,6 +206,38 @@ def test_full_pipeline(image_path: str) -> bool:
         return False
 
 
+def test_batch(image_paths: list[str]) -> bool:
+    """
+    Executa o pipeline completo para várias imagens em paralelo.
+
+    Threads bastam: o onnxruntime (rembg) e o Pillow liberam o GIL. Em CPU
+    a inferência é serializada pelo remove_background, mas composição,
+    validação e I/O das outras imagens seguem em paralelo.
+
+    Args:
+        image_paths: Caminhos das imagens de teste
+
+    Returns:
+        True se todas passaram, False caso contrário
+    """
+    # rembg (via pymatting/numba) precisa ser importado na thread principal:
+    # importado só dentro das threads do pool, a saída do processo trava
+    from app.services.image_pipeline import remove_background  # noqa: F401
+
+    workers = min(len(image_paths), os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(test_full_pipeline, image_paths))
+
+    print("=" * 60)
+    print("RESUMO DO LOTE")
+    print("=" * 60)
+    for image_path, passed in zip(image_paths, results):
+        print(f"  {'✅' if passed else '❌'} {image_path}")
+    print(f"RESULTADO: {sum(results)}/{len(results)} imagens aprovadas")
+
+    return all(results)
+
+
 # =============================================================================
 # Testes de Casos de Erro
 # =============================================================================
@@ -208,13 +253,15 @@ def test_error_cases() -> dict:
     print("TESTES DE CASOS DE ERRO")
     print("=" * 60)
 
+    from app.services.image_pipeline import remove_background
+
     results = {}
 
     # Teste 1: Arquivo corrompido
     print("\n[TEST 1] Arquivo corrompido...")
     try:
         corrupted_bytes = b"not a valid image file"
-        remove(corrupted_bytes)
+        remove_background(corrupted_bytes)
         results["corrupted_file"] = False
         print("  ❌ FALHOU - Deveria ter lançado exceção")
     except Exception as e:
@@ -266,7 +313,7 @@ def test_error_cases() -> dict:
     print("\n[TEST 4] Bytes vazios...")
     try:
         empty_bytes = b""
-        remove(empty_bytes)
+        remove_background(empty_bytes)
         results["empty_bytes"] = False
         print("  ❌ FALHOU - Deveria ter lançado exceção")
     except Exception as e:
@@ -293,6 +340,7 @@ if __name__ == "__main__":
         print()
         print("Exemplos:")
         print("  python scripts/test_pipeline.py ~/bolsa_teste.jpg  # Teste normal")
+        print("  python scripts/test_pipeline.py ~/a.jpg ~/b.jpg    # Lote em paralelo")
         print("  python scripts/test_pipeline.py --errors           # Testes de erro")
         sys.exit(1)
 
@@ -303,12 +351,16 @@ if __name__ == "__main__":
         total = len(results)
         sys.exit(0 if passed == total else 1)
 
-    # Modo normal
-    image_path = sys.argv[1]
+    # Modo normal (uma ou mais imagens)
+    image_paths = sys.argv[1:]
 
-    if not os.path.exists(image_path):
-        print(f"❌ Arquivo não encontrado: {image_path}")
-        sys.exit(1)
+    for image_path in image_paths:
+        if not os.path.exists(image_path):
+            print(f"❌ Arquivo não encontrado: {image_path}")
+            sys.exit(1)
 
-    success = test_full_pipeline(image_path)
+    if len(image_paths) == 1:
+        success = test_full_pipeline(image_paths[0])
+    else:
+        success = test_batch(image_paths)
     sys.exit(0 if success else 1)
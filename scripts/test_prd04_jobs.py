@@ -8,12 +8,16 @@ Uso:
     python scripts/test_prd04_jobs.py --test-worker  (testa worker isolado)
     python scripts/test_prd04_jobs.py --test-api     (testa apenas endpoints)
     python scripts/test_prd04_jobs.py --all          (todos os testes)
+    python scripts/test_prd04_jobs.py --all --repeat 3  (repete a bateria)
 """
 
 import os
 import sys
+import json
 import time
 import argparse
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 # Adicionar diretório raiz ao path
@@ -22,6 +26,26 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 # Configuração
 BASE_URL = os.getenv("TEST_BASE_URL", "http://localhost:8000")
 TEST_IMAGE = os.getenv("TEST_IMAGE", "test_images/bolsa_teste.png")
+CONNECT_TIMEOUT = 1.0  # connect curto: servidor fora do ar falha rápido (read fica por chamada)
+
+# orjson (opcional): parse das respostas ~2-3x mais rápido que o json da
+# stdlib; ambos aceitam os bytes do corpo direto (sem decode para str)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+
+def response_json(response):
+    """Parse do corpo JSON de uma resposta do requests."""
+    return _json_loads(response.content)
+
+
+def error_snippet(response, limit=200):
+    """Início do corpo para mensagens de falha (sem a detecção de charset do .text)."""
+    return response.content[:limit].decode("utf-8", "replace")
+
 
 # Cores para output
 GREEN = "\033[92m"
@@ -30,22 +54,32 @@ YELLOW = "\033[93m"
 BLUE = "\033[94m"
 RESET = "\033[0m"
 
+# Prefixos (cor + símbolo + reset) e banners montados uma vez
+_OK = f"{GREEN}✓{RESET} "
+_FAIL = f"{RED}✗{RESET} "
+_WARN = f"{YELLOW}⚠{RESET} "
+_INFO = f"{BLUE}ℹ{RESET} "
+_BANNER = "=" * 60
+_RESULT_BANNER = "=" * 40
+
+# Barras de progresso pré-montadas (21 estados possíveis de 20 caracteres)
+_BAR_LEN = 20
+_BARS = tuple("█" * filled + "░" * (_BAR_LEN - filled) for filled in range(_BAR_LEN + 1))
+
 def print_ok(msg):
-    print(f"{GREEN}✓{RESET} {msg}")
+    print(_OK + str(msg))
 
 def print_fail(msg):
-    print(f"{RED}✗{RESET} {msg}")
+    print(_FAIL + str(msg))
 
 def print_warn(msg):
-    print(f"{YELLOW}⚠{RESET} {msg}")
+    print(_WARN + str(msg))
 
 def print_info(msg):
-    print(f"{BLUE}ℹ{RESET} {msg}")
+    print(_INFO + str(msg))
 
 def print_header(msg):
-    print(f"\n{'='*60}")
-    print(f"  {msg}")
-    print(f"{'='*60}\n")
+    print(f"\n{_BANNER}\n  {msg}\n{_BANNER}\n")
 
 
 # ============================================
@@ -89,13 +123,23 @@ def test_database_crud():
         print_warn("Verifique se a tabela 'products' existe no Supabase")
         return results
     
-    # Teste 1: create_job
-    try:
-        job_id = create_job(
+    # Os 3 jobs (principal, fail e fila) são independentes entre si: criá-los
+    # em paralelo sobrepõe a latência de rede dos inserts. O cliente supabase
+    # é síncrono, então o paralelismo vem de threads. Erros de cada insert
+    # aparecem no .result() do teste correspondente.
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        job_future = executor.submit(
+            create_job,
             product_id=test_product_id,
             user_id=test_user_id,
             input_data={"test": True, "timestamp": time.time()}
         )
+        fail_job_future = executor.submit(create_job, test_product_id, test_user_id, {"test": "fail"})
+        queue_job_future = executor.submit(create_job, test_product_id, test_user_id, {"test": "queue"})
+    
+    # Teste 1: create_job
+    try:
+        job_id = job_future.result()
         if job_id:
             print_ok(f"create_job() retornou job_id: {job_id[:8]}...")
             results.append(True)
@@ -123,14 +167,13 @@ def test_database_crud():
     
     # Teste 3: update_job_progress
     try:
-        success = update_job_progress(
+        job = update_job_progress(
             job_id,
             status="processing",
             current_step="segmenting",
             progress=25
         )
-        if success:
-            job = get_job(job_id)
+        if job:
             if job["status"] == "processing" and job["progress"] == 25:
                 print_ok("update_job_progress() atualizou corretamente")
                 results.append(True)
@@ -138,7 +181,7 @@ def test_database_crud():
                 print_fail(f"update_job_progress() valores incorretos")
                 results.append(False)
         else:
-            print_fail("update_job_progress() retornou False")
+            print_fail("update_job_progress() retornou None")
             results.append(False)
     except Exception as e:
         print_fail(f"update_job_progress() erro: {e}")
@@ -162,13 +205,12 @@ def test_database_crud():
         # Resetar para processing primeiro
         update_job_progress(job_id, status="processing")
         
-        success = complete_job(job_id, {
+        job = complete_job(job_id, {
             "images": {"test": "data"},
             "quality_score": 95,
             "quality_passed": True
         })
-        if success:
-            job = get_job(job_id)
+        if job:
             if job["status"] == "completed":
                 print_ok("complete_job() marcou como completed")
                 results.append(True)
@@ -176,18 +218,17 @@ def test_database_crud():
                 print_fail(f"complete_job() status incorreto: {job['status']}")
                 results.append(False)
         else:
-            print_fail("complete_job() retornou False")
+            print_fail("complete_job() retornou None")
             results.append(False)
     except Exception as e:
         print_fail(f"complete_job() erro: {e}")
         results.append(False)
     
-    # Teste 6: fail_job (criar novo job para testar)
+    # Teste 6: fail_job (job próprio, criado no início)
     try:
-        job_id_2 = create_job(test_product_id, test_user_id, {"test": "fail"})
-        success = fail_job(job_id_2, "Erro de teste definitivo")
-        if success:
-            job = get_job(job_id_2)
+        job_id_2 = fail_job_future.result()
+        job = fail_job(job_id_2, "Erro de teste definitivo")
+        if job:
             if job["status"] == "failed":
                 print_ok("fail_job() marcou como failed")
                 results.append(True)
@@ -195,7 +236,7 @@ def test_database_crud():
                 print_fail(f"fail_job() status incorreto: {job['status']}")
                 results.append(False)
         else:
-            print_fail("fail_job() retornou False")
+            print_fail("fail_job() retornou None")
             results.append(False)
     except Exception as e:
         print_fail(f"fail_job() erro: {e}")
@@ -216,8 +257,8 @@ def test_database_crud():
     
     # Teste 8: get_next_queued_job
     try:
-        # Criar um novo job queued
-        job_id_3 = create_job(test_product_id, test_user_id, {"test": "queue"})
+        # Job queued criado no início (ainda na fila)
+        job_id_3 = queue_job_future.result()
         
         next_job = get_next_queued_job()
         if next_job:
@@ -237,22 +278,69 @@ def test_database_crud():
 # TESTES DE API (Endpoints)
 # ============================================
 
-def test_api_endpoints():
-    """Testa endpoints da API."""
+def create_session():
+    """
+    Cria requests.Session com keep-alive e retry em falhas de conexão.
+    
+    Uma conexão reaproveitada para todas as chamadas (inclusive o polling
+    de GET /jobs/{id}), em vez de um handshake TCP por request.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+    
+    retry = Retry(total=3, backoff_factor=0.2)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _get_own_session(url, timeout):
+    """GET com Session própria, para threads (Session não é thread-safe)."""
+    with create_session() as session:
+        return session.get(url, timeout=timeout)
+
+
+@lru_cache(maxsize=1)
+def load_test_image() -> bytes:
+    """Lê TEST_IMAGE uma vez; rodadas do --repeat reutilizam os mesmos bytes."""
+    with open(TEST_IMAGE, "rb") as f:
+        return f.read()
+
+
+def test_api_endpoints(session):
+    """
+    Testa endpoints da API.
+    
+    Args:
+        session: requests.Session criada no main() (None se 'requests' não
+            estiver instalado), reaproveitada entre rodadas do --repeat
+    """
     print_header("TESTE: API Endpoints")
     
-    try:
-        import requests
-    except ImportError:
+    if session is None:
         print_fail("Módulo 'requests' não instalado")
         print_warn("Execute: pip install requests")
         return []
     
     results = []
     
+    # Health check em uma thread enquanto a imagem de teste é lida do disco
+    # (a conexão keep-alive aberta aqui já serve ao POST logo depois)
+    executor = ThreadPoolExecutor(max_workers=1)
+    health_future = executor.submit(session.get, f"{BASE_URL}/health", timeout=(CONNECT_TIMEOUT, 5))
+    executor.shutdown(wait=False)
+    
+    image_found = os.path.exists(TEST_IMAGE)
+    if image_found:
+        load_test_image()
+    
     # Verificar se servidor está rodando
     try:
-        response = requests.get(f"{BASE_URL}/health", timeout=5)
+        response = health_future.result()
         if response.status_code == 200:
             print_ok(f"Servidor rodando em {BASE_URL}")
         else:
@@ -264,7 +352,7 @@ def test_api_endpoints():
         return results
     
     # Verificar se imagem de teste existe
-    if not os.path.exists(TEST_IMAGE):
+    if not image_found:
         print_fail(f"Imagem de teste não encontrada: {TEST_IMAGE}")
         print_warn("Crie a imagem ou defina TEST_IMAGE=/caminho/para/imagem.png")
         return results
@@ -274,15 +362,14 @@ def test_api_endpoints():
     # Teste 1: POST /process-async
     job_id = None
     try:
-        with open(TEST_IMAGE, "rb") as f:
-            response = requests.post(
-                f"{BASE_URL}/process-async",
-                files={"file": ("test.png", f, "image/png")},
-                timeout=30
-            )
+        response = session.post(
+            f"{BASE_URL}/process-async",
+            files={"file": ("test.png", load_test_image(), "image/png")},
+            timeout=(CONNECT_TIMEOUT, 30)
+        )
         
         if response.status_code == 200:
-            data = response.json()
+            data = response_json(response)
             if "job_id" in data and "product_id" in data:
                 print_ok(f"POST /process-async retornou job_id: {data['job_id'][:8]}...")
                 print(f"    product_id: {data['product_id'][:8]}...")
@@ -294,7 +381,7 @@ def test_api_endpoints():
                 results.append(False)
                 return results
         else:
-            print_fail(f"POST /process-async retornou {response.status_code}: {response.text[:200]}")
+            print_fail(f"POST /process-async retornou {response.status_code}: {error_snippet(response)}")
             results.append(False)
             return results
     except Exception as e:
@@ -302,32 +389,57 @@ def test_api_endpoints():
         results.append(False)
         return results
     
+    # A listagem (Teste 3) não depende do resultado do polling: dispara já em
+    # uma thread, com Session própria, para sobrepor a latência dela à
+    # espera do job
+    executor = ThreadPoolExecutor(max_workers=1)
+    jobs_list_future = executor.submit(_get_own_session, f"{BASE_URL}/jobs", (CONNECT_TIMEOUT, 10))
+    executor.shutdown(wait=False)
+    
     # Teste 2: GET /jobs/{job_id} - polling
+    # Barra redesenhada com \r só em terminal e só quando muda; em log
+    # (stdout redirecionado) sai uma linha por transição de estado
+    is_tty = sys.stdout.isatty()
+    last_line = None
+    
+    def close_bar():
+        if is_tty and last_line is not None:
+            print()  # Nova linha
+    
     try:
-        max_polls = 60  # 60 polls * 2s = 120s timeout
-        poll_interval = 2
+        # Backoff: começa em 100ms e cresce 1.5x até 2s, então jobs rápidos
+        # são detectados quase na hora e os lentos não martelam a API.
+        # Prazo por relógio monotônico: o tempo das próprias requests conta.
+        max_wait = 120
+        poll_interval = 0.1
+        max_poll_interval = 2.0
         
-        print_info(f"Aguardando processamento (max {max_polls * poll_interval}s)...")
+        print_info(f"Aguardando processamento (max {max_wait}s)...")
         
         final_status = None
-        for i in range(max_polls):
-            response = requests.get(f"{BASE_URL}/jobs/{job_id}", timeout=10)
+        deadline = time.monotonic() + max_wait
+        while time.monotonic() < deadline:
+            response = session.get(f"{BASE_URL}/jobs/{job_id}", timeout=(CONNECT_TIMEOUT, 10))
             
             if response.status_code == 200:
-                data = response.json()
+                data = response_json(response)
                 status = data.get("status")
                 progress = data.get("progress", 0)
                 step = data.get("current_step", "?")
                 
                 # Progress bar visual
-                bar_len = 20
-                filled = int(bar_len * progress / 100)
-                bar = "█" * filled + "░" * (bar_len - filled)
+                bar = _BARS[min(max(int(_BAR_LEN * progress / 100), 0), _BAR_LEN)]
                 
-                print(f"\r    [{bar}] {progress:3d}% | {step:15} | status={status}", end="", flush=True)
+                line = f"    [{bar}] {progress:3d}% | {step:15} | status={status}"
+                if line != last_line:
+                    if is_tty:
+                        print(f"\r{line}", end="", flush=True)
+                    else:
+                        print(line)
+                    last_line = line
                 
                 if status == "completed":
-                    print()  # Nova linha
+                    close_bar()
                     print_ok(f"Job completou com sucesso!")
                     print(f"    quality_score: {data.get('quality_score')}")
                     print(f"    quality_passed: {data.get('quality_passed')}")
@@ -337,7 +449,7 @@ def test_api_endpoints():
                     final_status = "completed"
                     break
                 elif status == "failed":
-                    print()  # Nova linha
+                    close_bar()
                     print_fail(f"Job falhou: {data.get('last_error')}")
                     print(f"    attempts: {data.get('attempts')}/{data.get('max_attempts')}")
                     print(f"    can_retry: {data.get('can_retry')}")
@@ -345,27 +457,28 @@ def test_api_endpoints():
                     final_status = "failed"
                     break
                 else:
-                    time.sleep(poll_interval)
+                    time.sleep(max(0.0, min(poll_interval, deadline - time.monotonic())))
+                    poll_interval = min(poll_interval * 1.5, max_poll_interval)
             else:
-                print()
-                print_fail(f"GET /jobs/{{id}} retornou {response.status_code}")
+                close_bar()
+                print_fail(f"GET /jobs/{{id}} retornou {response.status_code}: {error_snippet(response)}")
                 results.append(False)
                 break
         else:
-            print()
+            close_bar()
             print_fail("GET /jobs/{id} - Timeout aguardando conclusão")
             results.append(False)
     except Exception as e:
-        print()
+        close_bar()
         print_fail(f"GET /jobs/{{id}} erro: {e}")
         results.append(False)
     
     # Teste 3: GET /jobs (listagem)
     try:
-        response = requests.get(f"{BASE_URL}/jobs", timeout=10)
+        response = jobs_list_future.result()
         
         if response.status_code == 200:
-            data = response.json()
+            data = response_json(response)
             if "jobs" in data and "total" in data:
                 print_ok(f"GET /jobs retornou {data['total']} jobs")
                 results.append(True)
@@ -373,7 +486,7 @@ def test_api_endpoints():
                 print_fail(f"GET /jobs response incompleto: {data}")
                 results.append(False)
         else:
-            print_fail(f"GET /jobs retornou {response.status_code}")
+            print_fail(f"GET /jobs retornou {response.status_code}: {error_snippet(response)}")
             results.append(False)
     except Exception as e:
         print_fail(f"GET /jobs erro: {e}")
@@ -458,6 +571,7 @@ def main():
     parser.add_argument("--test-api", action="store_true", help="Testa apenas endpoints API")
     parser.add_argument("--test-worker", action="store_true", help="Testa worker isolado")
     parser.add_argument("--all", action="store_true", help="Executa todos os testes")
+    parser.add_argument("--repeat", type=int, default=1, help="Repete a bateria N vezes no mesmo processo/session")
     
     args = parser.parse_args()
     
@@ -467,23 +581,38 @@ def main():
     
     all_results = []
     
-    print("\n" + "="*60)
-    print("  FRIDA PRD-04: Testes de Jobs Async")
-    print("="*60)
-    print(f"  BASE_URL: {BASE_URL}")
-    print(f"  TEST_IMAGE: {TEST_IMAGE}")
-    
-    if args.test_db or args.all:
-        results = test_database_crud()
-        all_results.extend(results)
-    
-    if args.test_worker or args.all:
-        results = test_worker_isolated()
-        all_results.extend(results)
+    print(
+        f"\n{_BANNER}\n  FRIDA PRD-04: Testes de Jobs Async\n{_BANNER}\n"
+        f"  BASE_URL: {BASE_URL}\n  TEST_IMAGE: {TEST_IMAGE}"
+    )
     
+    # Session única para todas as rodadas (imports e conexões aquecem uma vez)
+    session = None
     if args.test_api or args.all:
-        results = test_api_endpoints()
-        all_results.extend(results)
+        try:
+            session = create_session()
+        except ImportError:
+            pass  # test_api_endpoints reporta a ausência do módulo
+    
+    try:
+        for run in range(max(1, args.repeat)):
+            if args.repeat > 1:
+                print_info(f"Rodada {run + 1}/{args.repeat}")
+            
+            if args.test_db or args.all:
+                results = test_database_crud()
+                all_results.extend(results)
+            
+            if args.test_worker or args.all:
+                results = test_worker_isolated()
+                all_results.extend(results)
+            
+            if args.test_api or args.all:
+                results = test_api_endpoints(session)
+                all_results.extend(results)
+    finally:
+        if session is not None:
+            session.close()
     
     # Resumo
     print_header("RESUMO")
@@ -497,14 +626,10 @@ def main():
         print(f"Testes passaram: {passed}/{total} ({percentage:.0f}%)")
         
         if passed == total:
-            print(f"\n{GREEN}{'='*40}")
-            print(f"  ✓ TODOS OS TESTES PASSARAM!")
-            print(f"{'='*40}{RESET}")
+            print(f"\n{GREEN}{_RESULT_BANNER}\n  ✓ TODOS OS TESTES PASSARAM!\n{_RESULT_BANNER}{RESET}")
             return 0
         else:
-            print(f"\n{RED}{'='*40}")
-            print(f"  ✗ {total - passed} teste(s) falharam")
-            print(f"{'='*40}{RESET}")
+            print(f"\n{RED}{_RESULT_BANNER}\n  ✗ {total - passed} teste(s) falharam\n{_RESULT_BANNER}{RESET}")
             return 1
     else:
         print_warn("Nenhum teste executado")
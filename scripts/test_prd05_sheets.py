@@ -13,17 +13,24 @@ Uso:
     
     # Apenas API (servidor deve estar rodando)
     TEST_PRODUCT_ID=xxx python scripts/test_prd05_sheets.py --test-api
+    
+    # Repetir a bateria no mesmo processo (session e imports reaproveitados)
+    TEST_PRODUCT_ID=xxx python scripts/test_prd05_sheets.py --test-api --repeat 3
 """
 
 import sys
 import os
+import json
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # Add parent dir to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # =============================================================================
 # Configuration
@@ -32,6 +39,16 @@ import requests
 BASE_URL = os.getenv("API_URL", "http://localhost:8000")
 TEST_PRODUCT_ID = os.getenv("TEST_PRODUCT_ID", "")
 TEST_USER_ID = os.getenv("TEST_USER_ID", "")
+CONNECT_TIMEOUT = 1.0  # connect curto: servidor fora do ar falha rápido
+TIMEOUT = (CONNECT_TIMEOUT, 10)  # (connect, read) em segundos
+
+# orjson (opcional): parse das respostas ~2-3x mais rápido que o json da
+# stdlib; ambos aceitam os bytes do corpo direto (sem decode para str)
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 
 # =============================================================================
@@ -58,6 +75,22 @@ def print_warning(message: str):
     print(f"⚠ {message}")
 
 
+def response_json(response: requests.Response):
+    """Parse do corpo JSON de uma resposta do requests."""
+    return _json_loads(response.content)
+
+
+def create_session() -> requests.Session:
+    """Cria Session com keep-alive (uma conexão para todos os testes) e retry em falhas de conexão."""
+    retry = Retry(total=3, backoff_factor=0.2)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+    
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 # =============================================================================
 # Database CRUD Tests
 # =============================================================================
@@ -139,21 +172,21 @@ def test_database_crud() -> tuple:
     total += 1
     if created_sheet_id:
         try:
-            success = update_technical_sheet(
+            # Linha devolvida pelo próprio UPDATE: sem get_technical_sheet extra
+            updated = update_technical_sheet(
                 sheet_id=created_sheet_id,
                 data={"test_field": "updated", "new_field": 123},
                 user_id=TEST_USER_ID
             )
-            if success:
+            if updated:
                 # Verificar se versão incrementou
-                updated = get_technical_sheet(created_sheet_id)
-                if updated and updated.get("version", 0) >= 2:
+                if updated.get("version", 0) >= 2:
                     passed += 1
                     print_result("update_technical_sheet()", True, f"version={updated['version']}")
                 else:
                     print_result("update_technical_sheet()", False, "Versão não incrementou")
             else:
-                print_result("update_technical_sheet()", False, "Retornou False")
+                print_result("update_technical_sheet()", False, "Retornou None")
         except Exception as e:
             print_result("update_technical_sheet()", False, str(e))
     else:
@@ -199,12 +232,64 @@ def test_database_crud() -> tuple:
 # API Endpoint Tests
 # =============================================================================
 
-def test_api_endpoints() -> tuple:
+def _check_get_sheet(session: requests.Session) -> tuple:
+    """GET /products/{id}/sheet → (ok, detalhes)."""
+    response = session.get(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet", timeout=TIMEOUT)
+    if response.status_code != 200:
+        return (False, f"status={response.status_code}")
+    return (True, f"version={response_json(response).get('version', '?')}")
+
+
+def _check_get_versions(session: requests.Session) -> tuple:
+    """GET /products/{id}/sheet/versions → (ok, detalhes)."""
+    response = session.get(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet/versions", timeout=TIMEOUT)
+    if response.status_code != 200:
+        return (False, f"status={response.status_code}")
+    return (True, f"total={response_json(response).get('total', 0)}")
+
+
+def _check_export_pdf(session: requests.Session) -> tuple:
+    """GET /products/{id}/sheet/export/pdf → (ok, detalhes)."""
+    # stream=True: o PDF é contado em chunks, sem materializar o corpo inteiro
+    with session.get(
+        f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet/export/pdf",
+        stream=True,
+        timeout=(CONNECT_TIMEOUT, 30)
+    ) as response:
+        if response.status_code != 200:
+            return (False, f"status={response.status_code}")
+        
+        content_type = response.headers.get("content-type", "")
+        if "application/pdf" not in content_type:
+            return (False, f"content-type={content_type}")
+        
+        size = 0
+        magic = b""
+        for chunk in response.iter_content(chunk_size=65536):
+            if not magic:
+                magic = chunk[:5]
+            size += len(chunk)
+    
+    if magic != b"%PDF-":
+        return (False, f"Assinatura inválida: {magic!r}")
+    return (True, f"{size} bytes")
+
+
+def _run_check(check) -> tuple:
+    """Roda um _check_* com Session própria (Session não é thread-safe)."""
+    with create_session() as session:
+        return check(session)
+
+
+def test_api_endpoints(session: requests.Session) -> tuple:
     """
     Testa endpoints REST da API.
     
     Requer: TEST_PRODUCT_ID e servidor rodando.
     
+    Args:
+        session: Session criada no main(), reaproveitada entre rodadas
+    
     Returns:
         Tuple (passed, total)
     """
@@ -217,7 +302,7 @@ def test_api_endpoints() -> tuple:
     
     # Verificar se servidor está rodando
     try:
-        health = requests.get(f"{BASE_URL}/health", timeout=5)
+        health = session.get(f"{BASE_URL}/health", timeout=(CONNECT_TIMEOUT, 5))
         if health.status_code != 200:
             print_warning(f"Servidor não está respondendo em {BASE_URL}")
             return (0, 0)
@@ -232,9 +317,9 @@ def test_api_endpoints() -> tuple:
     # Test 1: POST /products/{id}/sheet
     total += 1
     try:
-        response = requests.post(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet")
+        response = session.post(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet", timeout=TIMEOUT)
         if response.status_code == 200:
-            data = response.json()
+            data = response_json(response)
             if data.get("sheet_id"):
                 passed += 1
                 print_result(
@@ -249,21 +334,7 @@ def test_api_endpoints() -> tuple:
     except Exception as e:
         print_result("POST /products/{id}/sheet", False, str(e))
     
-    # Test 2: GET /products/{id}/sheet
-    total += 1
-    try:
-        response = requests.get(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet")
-        if response.status_code == 200:
-            data = response.json()
-            version = data.get("version", "?")
-            passed += 1
-            print_result("GET /products/{id}/sheet", True, f"version={version}")
-        else:
-            print_result("GET /products/{id}/sheet", False, f"status={response.status_code}")
-    except Exception as e:
-        print_result("GET /products/{id}/sheet", False, str(e))
-    
-    # Test 3: PUT /products/{id}/sheet
+    # Test 2: PUT /products/{id}/sheet (única mutação depois do POST)
     total += 1
     try:
         payload = {
@@ -273,12 +344,13 @@ def test_api_endpoints() -> tuple:
             },
             "change_summary": "Test update"
         }
-        response = requests.put(
+        response = session.put(
             f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet",
-            json=payload
+            json=payload,
+            timeout=TIMEOUT
         )
         if response.status_code == 200:
-            data = response.json()
+            data = response_json(response)
             version = data.get("version", "?")
             passed += 1
             print_result("PUT /products/{id}/sheet", True, f"version={version}")
@@ -287,36 +359,25 @@ def test_api_endpoints() -> tuple:
     except Exception as e:
         print_result("PUT /products/{id}/sheet", False, str(e))
     
-    # Test 4: GET /products/{id}/sheet/versions
-    total += 1
-    try:
-        response = requests.get(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet/versions")
-        if response.status_code == 200:
-            data = response.json()
-            total_versions = data.get("total", 0)
-            passed += 1
-            print_result("GET /products/{id}/sheet/versions", True, f"total={total_versions}")
-        else:
-            print_result("GET /products/{id}/sheet/versions", False, f"status={response.status_code}")
-    except Exception as e:
-        print_result("GET /products/{id}/sheet/versions", False, str(e))
-    
-    # Test 5: GET /products/{id}/sheet/export/pdf
-    total += 1
-    try:
-        response = requests.get(f"{BASE_URL}/products/{TEST_PRODUCT_ID}/sheet/export/pdf")
-        if response.status_code == 200:
-            content_type = response.headers.get("content-type", "")
-            if "application/pdf" in content_type:
-                size = len(response.content)
-                passed += 1
-                print_result("GET /products/{id}/sheet/export/pdf", True, f"{size} bytes")
-            else:
-                print_result("GET /products/{id}/sheet/export/pdf", False, f"content-type={content_type}")
-        else:
-            print_result("GET /products/{id}/sheet/export/pdf", False, f"status={response.status_code}")
-    except Exception as e:
-        print_result("GET /products/{id}/sheet/export/pdf", False, str(e))
+    # Tests 3-5: leituras independentes entre si, em paralelo, cada uma com
+    # sua Session (latência total ≈ a da mais lenta); resultados impressos
+    # na ordem fixa
+    checks = {
+        "GET /products/{id}/sheet": _check_get_sheet,
+        "GET /products/{id}/sheet/versions": _check_get_versions,
+        "GET /products/{id}/sheet/export/pdf": _check_export_pdf,
+    }
+    with ThreadPoolExecutor(max_workers=len(checks)) as executor:
+        futures = {name: executor.submit(_run_check, check) for name, check in checks.items()}
+    
+    for name, future in futures.items():
+        total += 1
+        try:
+            ok, details = future.result()
+            passed += ok
+            print_result(name, ok, details)
+        except Exception as e:
+            print_result(name, False, str(e))
     
     return (passed, total)
 
@@ -331,6 +392,7 @@ def main():
     parser.add_argument("--all", action="store_true", help="Run all tests")
     parser.add_argument("--test-db", action="store_true", help="Test database CRUD")
     parser.add_argument("--test-api", action="store_true", help="Test API endpoints")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeat the test battery N times in-process")
     
     args = parser.parse_args()
     
@@ -350,16 +412,21 @@ def main():
     total_passed = 0
     total_tests = 0
     
-    # Run tests
-    if args.all or args.test_db:
-        passed, tests = test_database_crud()
-        total_passed += passed
-        total_tests += tests
-    
-    if args.all or args.test_api:
-        passed, tests = test_api_endpoints()
-        total_passed += passed
-        total_tests += tests
+    # Run tests (uma Session para todas as rodadas)
+    with create_session() as session:
+        for run in range(max(1, args.repeat)):
+            if args.repeat > 1:
+                print(f"\n🔁 Rodada {run + 1}/{args.repeat}")
+            
+            if args.all or args.test_db:
+                passed, tests = test_database_crud()
+                total_passed += passed
+                total_tests += tests
+            
+            if args.all or args.test_api:
+                passed, tests = test_api_endpoints(session)
+                total_passed += passed
+                total_tests += tests
     
     # Summary
     print_header("SUMMARY")